@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+sync-commands.py 基准测试
+
+功能：
+1. 按指定规模生成合成 CCW 仓库（嵌套命名空间的命令、技能、提示词）
+2. 同时生成带可控偏差的 commands.ts / deprecated.ts / patterns.ts
+3. 分阶段计时：目录扫描、TS 数据提取、集合差异计算、报告渲染
+4. 统计各阶段峰值内存，并通过 sync-commands.py 的剖析埋点收集各扫描器计数器
+5. 结果保存为 JSON，可与其他版本的结果对比
+
+使用方法：
+  python scripts/bench-sync.py                                # 默认规模 1000,10000
+  python scripts/bench-sync.py --sizes 1000,10000,100000      # 指定规模
+  python scripts/bench-sync.py --output bench.json            # 保存结果
+  python scripts/bench-sync.py --compare old.json             # 与历史结果对比
+  python scripts/bench-sync.py --keep /tmp/ccw-bench          # 保留生成的仓库
+  python scripts/bench-sync.py --trace-dir /tmp/traces         # 每个规模输出 Chrome trace
+"""
+
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+import importlib.util
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+SCRIPT_DIR = Path(__file__).parent
+
+def load_sync_module():
+    """加载 sync-commands.py（文件名含连字符，不能直接 import）"""
+    spec = importlib.util.spec_from_file_location('sync_commands', SCRIPT_DIR / 'sync-commands.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+sync = load_sync_module()
+
+# 命令数在四个来源间的分配比例
+SOURCE_SHARES = {
+    'claude/commands': 0.4,
+    'claude/skills': 0.2,
+    'codex/prompts': 0.1,
+    'codex/skills': 0.3,
+}
+
+# ============================================
+# 合成仓库生成
+# ============================================
+
+def _command_entry(cmd: str, category: str, cli: str) -> str:
+    return (f"  {{ cmd: '{cmd}', desc: '合成命令 {cmd}', status: 'stable', category: '{category}', "
+            f"cli: '{cli}', addedInVersion: 'v1.0',\n"
+            f"    detail: '基准测试生成的命令，用于测量 {cmd} 的扫描与解析开销',\n"
+            f"    usage: '基准测试'\n  }},\n")
+
+def generate_repo(root: Path, size: int, drift: float = 0.05, seed: int = 42) -> Dict[str, int]:
+    """在 root 下生成规模为 size 的合成仓库
+
+    Args:
+        size: 目录中实际存在的命令总数
+        drift: 各类偏差（缺失/多余/残留/孤立引用）占 size 的比例
+
+    Returns:
+        Dict[str, int]: 各来源命令数与注入的偏差数量
+    """
+    rng = random.Random(seed)
+    namespaces = max(1, int(size ** 0.5) // 4)
+    actual: List[tuple] = []  # (命令, 来源)
+
+    counts = {source: int(size * share) for source, share in SOURCE_SHARES.items()}
+    counts['claude/commands'] += size - sum(counts.values())
+
+    commands_dir = root / '.claude' / 'commands'
+    for i in range(counts['claude/commands']):
+        ns = f'ns{i % namespaces}'
+        if i % 3 == 0:
+            # 二级命名空间：.claude/commands/ns/sub/name.md -> /ns:sub:name
+            sub = f'sub{(i // namespaces) % 4}'
+            path = commands_dir / ns / sub / f'cmd{i}.md'
+            cmd = f'/{ns}:{sub}:cmd{i}'
+        else:
+            path = commands_dir / ns / f'cmd{i}.md'
+            cmd = f'/{ns}:cmd{i}'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f'---\nname: cmd{i}\ndescription: 合成命令 {i}\n---\n\n# cmd{i}\n', encoding='utf-8')
+        actual.append((cmd, 'claude/commands'))
+
+    for source, prefix in (('claude/skills', 'cskill'), ('codex/skills', 'xskill')):
+        skills_dir = root.joinpath(*('.' + source).split('/'))
+        for i in range(counts[source]):
+            skill_dir = skills_dir / f'{prefix}-{i}'
+            (skill_dir / 'phases').mkdir(parents=True, exist_ok=True)
+            (skill_dir / 'SKILL.md').write_text(
+                f'---\nname: {prefix}-{i}\ndescription: 合成技能 {i}\n---\n\n# {prefix}-{i}\n', encoding='utf-8')
+            (skill_dir / 'phases' / '01-phase.md').write_text('# Phase 1\n', encoding='utf-8')
+            actual.append((f'/{prefix}-{i}', source))
+
+    prompts_dir = root / '.codex' / 'prompts'
+    prompts_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(counts['codex/prompts']):
+        (prompts_dir / f'prompt-{i}.md').write_text(f'# prompt-{i}\n', encoding='utf-8')
+        actual.append((f'/prompt-{i}', 'codex/prompts'))
+
+    # 注入偏差
+    n_drift = max(1, int(size * drift))
+    shuffled = actual[:]
+    rng.shuffle(shuffled)
+    missing = {cmd for cmd, _ in shuffled[:n_drift]}
+    stale = [cmd for cmd, _ in shuffled[n_drift:2 * n_drift]]
+    extra = [f'/removed:cmd{i}' for i in range(n_drift)]
+    orphans = [f'/orphan:cmd{i}' for i in range(n_drift)]
+
+    data_dir = root / 'src' / 'data'
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    parts = ["import type { Command } from './types';\n\nexport const COMMANDS: Command[] = [\n"]
+    for cmd, source in actual:
+        if cmd not in missing:
+            cli = 'claude' if source.startswith('claude') else 'codex'
+            category = 'skill' if source.endswith('skills') else 'workflow'
+            parts.append(_command_entry(cmd, category, cli))
+    for cmd in extra:
+        parts.append(_command_entry(cmd, 'workflow', 'claude'))
+    parts.append('];\n')
+    (data_dir / 'commands.ts').write_text(''.join(parts), encoding='utf-8')
+
+    parts = ["import type { DeprecatedCommand } from './types';\n\n"
+             "export const DEPRECATED_COMMANDS: DeprecatedCommand[] = [\n"]
+    for i, cmd in enumerate(stale):
+        # 混合替代命令、null 和通配符条目
+        new_cmd = f"'{actual[i][0]}'" if i % 2 else 'null'
+        parts.append(f"  {{ old: '{cmd}', newCmd: {new_cmd}, reason: '合成废弃', deprecatedInVersion: 'v0.{i % 9}' }},\n")
+    for i in range(min(namespaces, n_drift)):
+        parts.append(f"  {{ old: '/legacy{i}:*', newCmd: null, reason: '命名空间移除', deprecatedInVersion: 'v0.1' }},\n")
+    parts.append('];\n')
+    (data_dir / 'deprecated.ts').write_text(''.join(parts), encoding='utf-8')
+
+    parts = ["import type { CommandChain } from './types';\n\n"
+             "export const COMMAND_CHAINS: Record<string, CommandChain> = {\n"]
+    chain_size = 5
+    n_chains = max(1, len(actual) // chain_size)
+    for c in range(n_chains):
+        parts.append(f"  'chain-{c}': {{\n    flow: 'chain-{c}',\n    level: {c % 4 + 1},\n    commands: [\n")
+        for cmd, _ in actual[c * chain_size:(c + 1) * chain_size]:
+            parts.append(f"      {{ cmd: '{cmd}', desc: '步骤' }},\n")
+        if c < len(orphans):
+            parts.append(f"      {{ cmd: '{orphans[c]}', desc: '孤立引用' }},\n")
+        parts.append("    ],\n    tips: ['合成命令链'],\n  },\n")
+    parts.append('};\n')
+    (data_dir / 'patterns.ts').write_text(''.join(parts), encoding='utf-8')
+
+    return {
+        **{source.replace('/', '_'): count for source, count in counts.items()},
+        'missing': len(missing),
+        'extra': len(extra),
+        'stale': len(stale),
+        'orphans': min(len(orphans), n_chains),
+    }
+
+# ============================================
+# 分阶段测量
+# ============================================
+
+def run_phases(cache: Optional[Any] = None) -> Dict[str, float]:
+    """依次执行各阶段，返回 {阶段名: 耗时秒数}"""
+    timings = {}
+
+    start = time.perf_counter()
+    scans = sync.scan_all(cache)
+    timings['scan'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ts_records = sync.load_ts_commands(cache)
+    deprecated_records = sync.load_deprecated_commands(cache)
+    pattern_steps = sync.load_pattern_steps(cache)
+    timings['ts_extract'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = sync.compute_sync_diff(scans, ts_records, deprecated_records, pattern_steps)
+    timings['diff'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        sync.print_report(result)
+        print(sync.generate_fix_suggestions(result))
+    timings['report'] = time.perf_counter() - start
+
+    timings['total'] = sum(timings.values())
+    return timings
+
+def _reset_peak():
+    """重置 tracemalloc 峰值；reset_peak() 需要 Python 3.9+，3.8 上改为清空跟踪记录（峰值只计本阶段新分配的内存）"""
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.clear_traces()
+
+def measure_memory() -> Dict[str, int]:
+    """单独执行一遍，用 tracemalloc 记录各阶段的峰值内存（字节）"""
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for phase, fn in (
+            ('scan', lambda: sync.scan_all()),
+            ('ts_extract', lambda: (sync.load_ts_commands(), sync.load_deprecated_commands(),
+                                    sync.load_pattern_steps())),
+        ):
+            _reset_peak()
+            fn()
+            peaks[phase] = tracemalloc.get_traced_memory()[1]
+
+        _reset_peak()
+        result = sync.analyze_commands()
+        peaks['analyze'] = tracemalloc.get_traced_memory()[1]
+
+        _reset_peak()
+        with redirect_stdout(io.StringIO()):
+            sync.print_report(result)
+        peaks['report'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def profile_once(trace_path: Optional[Path] = None) -> List[Dict]:
+    """启用 sync-commands.py 的剖析埋点执行一遍完整分析，返回各阶段汇总"""
+    profiler = sync.enable_profiling()
+    try:
+        result = sync.analyze_commands()
+        with profiler.span('report'), redirect_stdout(io.StringIO()):
+            sync.print_report(result)
+    finally:
+        sync.disable_profiling()
+    if trace_path is not None:
+        profiler.write_trace(trace_path)
+    return profiler.summary()
+
+def bench_size(size: int, repeat: int, drift: float, keep: Optional[Path],
+               trace_dir: Optional[Path] = None) -> Dict:
+    """生成指定规模的仓库并测量"""
+    root = Path(tempfile.mkdtemp(prefix=f'ccw-bench-{size}-')) if keep is None else keep / str(size)
+    try:
+        gen_start = time.perf_counter()
+        if keep is not None and root.exists():
+            shutil.rmtree(root)
+        counts = generate_repo(root, size, drift)
+        gen_time = time.perf_counter() - gen_start
+
+        sync.set_root(root)
+        runs = [run_phases() for _ in range(repeat)]
+
+        # 内存缓存命中时的重复分析（监视模式/增量场景）
+        cache = sync.ScanCache(persist=False)
+        run_phases(cache)
+        warm = [run_phases(cache) for _ in range(repeat)]
+
+        phases = {}
+        for phase in runs[0]:
+            values = [r[phase] for r in runs]
+            phases[phase] = {'min': min(values), 'median': statistics.median(values)}
+        phases['total_warm_cache'] = {
+            'min': min(r['total'] for r in warm),
+            'median': statistics.median(r['total'] for r in warm),
+        }
+
+        return {
+            'size': size,
+            'generate_seconds': gen_time,
+            'counts': counts,
+            'phases': phases,
+            'peak_memory': measure_memory(),
+            'profile': profile_once(trace_dir / f'trace-{size}.json' if trace_dir else None),
+        }
+    finally:
+        if keep is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def print_results(results: List[Dict], baseline: Optional[Dict] = None):
+    """打印结果表，提供 baseline 时附带相对变化"""
+    base_by_size = {r['size']: r for r in (baseline or {}).get('results', [])}
+    for r in results:
+        print(f"\n规模 {r['size']}（生成耗时 {r['generate_seconds']:.2f}s）")
+        print(f"  {'阶段':18} {'最小(ms)':>10} {'中位(ms)':>10} {'对比':>9}")
+        base = base_by_size.get(r['size'], {}).get('phases', {})
+        for phase, stats in r['phases'].items():
+            delta = ''
+            if phase in base and base[phase]['median'] > 0:
+                delta = f"{(stats['median'] / base[phase]['median'] - 1) * 100:+.1f}%"
+            print(f"  {phase:18} {stats['min'] * 1000:10.2f} {stats['median'] * 1000:10.2f} {delta:>9}")
+        print('  峰值内存: ' + ', '.join(f"{k} {v / 1024 / 1024:.1f}MiB" for k, v in r['peak_memory'].items()))
+        for row in r.get('profile', []):
+            if row['name'].startswith(('scan:', 'parse:')) and row['counters']:
+                counters = ', '.join(f'{k}={v}' for k, v in sorted(row['counters'].items()))
+                print(f"  {row['name']:24} {counters}")
+
+def main():
+    parser = argparse.ArgumentParser(description='sync-commands.py 基准测试')
+    parser.add_argument('--sizes', default='1000,10000', help='逗号分隔的规模列表，默认 1000,10000')
+    parser.add_argument('--repeat', type=int, default=3, help='每个规模重复次数，默认 3')
+    parser.add_argument('--drift', type=float, default=0.05, help='偏差比例，默认 0.05')
+    parser.add_argument('--output', type=Path, help='结果 JSON 保存路径')
+    parser.add_argument('--compare', type=Path, help='用于对比的历史结果 JSON')
+    parser.add_argument('--keep', type=Path, help='在该目录下保留生成的仓库')
+    parser.add_argument('--trace-dir', type=Path, help='每个规模输出一份 Chrome trace-event JSON 到该目录')
+    args = parser.parse_args()
+
+    if args.trace_dir:
+        args.trace_dir.mkdir(parents=True, exist_ok=True)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    results = [bench_size(size, max(1, args.repeat), args.drift, args.keep, args.trace_dir)
+               for size in sizes]
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': args.repeat,
+            'drift': args.drift,
+        },
+        'results': results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n结果已保存: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -11,224 +11,1314 @@
 6. 检测残留旧命令（目录中存在但已被废弃）
 7. 支持自动修复模式
 
+8. 增量扫描缓存：目录 mtime 与数据文件哈希未变化时复用上次结果
+9. 数据文件使用流式分词器解析对象字面量，与字段顺序和引号风格无关，报告附带源码行号
+10. 监视模式：常驻内存，轮询 stat 检测变化，仅输出同步差异的增减
+11. 性能剖析：各阶段耗时与计数器汇总表，或 Chrome trace-event JSON
+12. 复用同一次目录扫描生成 public/commands-scanned.json，只读取各文件开头的 frontmatter 与首段描述
+13. 交叉引用校验：全部已知命令编译为一个多模式自动机，单遍扫描数据文件与文档，报告废弃/悬空引用
+14. 废弃规则支持 /ns:* 通配，沿替代链解析到最终替代命令并检测成环
+15. Git 增量模式：只检查相对某个提交或暂存区的变更所涉及的命令，以扫描缓存为基线
+16. 每次完整分析后更新 SQLite 命令索引，--query/--prefix 直接查询索引，毫秒级返回
+17. 批量模式：进程池并行分析多个仓库（分支 worktree、fork），输出汇总 JSON 与跨仓库差异
+18. 流式 NDJSON 输出：发现一条差异即输出一行，附修复建议与定位，退出码区分同步/差异/解析失败
+19. 技能内容相似度：按文件内容缓存 MinHash 签名，LSH 分带查找 .claude 与 .codex 之间重复或分化的技能
+
 使用方法：
-  python scripts/sync-commands.py          # 仅检查
-  python scripts/sync-commands.py --fix    # 自动修复（生成修复建议）
+  python scripts/sync-commands.py                  # 仅检查
+  python scripts/sync-commands.py --fix            # 自动修复（生成修复建议）
+  python scripts/sync-commands.py --no-cache       # 不读写扫描缓存与命令索引
+  python scripts/sync-commands.py --rebuild-cache  # 丢弃旧缓存并重新生成
+  python scripts/sync-commands.py --watch          # 监视模式（Ctrl+C 退出）
+  python scripts/sync-commands.py --profile        # 输出各阶段耗时汇总
+  python scripts/sync-commands.py --trace t.json   # 输出 Chrome trace 文件
+  python scripts/sync-commands.py --emit-scanned   # 同时生成 public/commands-scanned.json
+  python scripts/sync-commands.py --emit-scanned --quiet  # 只生成命令清单（npm run scan-commands）
+  python scripts/sync-commands.py --check-refs     # 校验数据文件与文档中的命令引用
+  python scripts/sync-commands.py --since main     # 只检查相对 main 的变更
+  python scripts/sync-commands.py --staged         # 只检查暂存区变更（pre-commit）
+  python scripts/sync-commands.py --query /ccw     # 查询命令是否存在、来源与废弃状态
+  python scripts/sync-commands.py --prefix /workflow:  # 列出命名空间下的命令
+  python scripts/sync-commands.py --batch ../fork-a ../fork-b  # 批量分析多个仓库
+  python scripts/sync-commands.py --manifest repos.txt        # 从清单读取仓库列表
+  python scripts/sync-commands.py --ndjson         # 流式输出差异（每行一条 JSON）
+  python scripts/sync-commands.py --skill-dups     # 对比 .claude 与 .codex 技能内容
 """
 
 import os
 import re
+import sys
+import threading
+import time
+import hashlib
+import sqlite3
+import subprocess
+import unicodedata
 import argparse
 import json
 from pathlib import Path
-from typing import Set, Dict, List, Tuple
+from contextlib import closing, contextmanager, nullcontext
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Set, Dict, List, Tuple, Optional, Callable, Any, NamedTuple, Iterator
 
 # 项目根目录
 ROOT_DIR = Path(__file__).parent.parent
 DATA_DIR = ROOT_DIR / 'src' / 'data'
 
-def get_claude_commands() -> Set[str]:
-    """扫描 .claude/commands 目录"""
-    commands = set()
-    commands_dir = ROOT_DIR / '.claude' / 'commands'
-
-    if not commands_dir.exists():
-        return commands
-
-    for root, dirs, files in os.walk(commands_dir):
-        # 排除 agent 目录
-        dirs[:] = [d for d in dirs if d != 'agent']
-
-        for f in files:
-            if f.endswith('.md'):
-                file_path = Path(root) / f
-                rel_path = file_path.relative_to(commands_dir)
-                parts = list(rel_path.parts)
-                parts[-1] = parts[-1][:-3]  # 移除 .md 后缀
-                if len(parts) == 1:
-                    cmd = '/' + parts[0]
-                else:
-                    cmd = '/' + parts[0] + ':' + ':'.join(parts[1:])
-                commands.add(cmd)
+# 扫描缓存（清单格式变化时递增 CACHE_VERSION，旧缓存自动作废）
+CACHE_FILE = ROOT_DIR / '.ccw' / 'sync-cache.json'
+CACHE_VERSION = 4
+# mtime 距当前时间小于该值（纳秒）的目录视为不可信，下次仍重新扫描
+RACY_MTIME_NS = 2_000_000_000
+
+# 命令索引：供 --query/--prefix 及其他工具直接查询，不必重新扫描
+INDEX_FILE = ROOT_DIR / '.ccw' / 'command-index.sqlite'
+
+# 前端使用的命令清单（原由 scripts/scan-commands.js 生成）
+SCANNED_FILE = ROOT_DIR / 'public' / 'commands-scanned.json'
+SCANNED_VERSION = '4.0.0'
+# 读取 Markdown 头部的初始字节数，frontmatter 或首段描述未读完时翻倍续读
+HEAD_READ_BYTES = 8192
+
+def set_root(root: Path):
+    """切换要分析的仓库根目录（基准测试等场景使用）"""
+    global ROOT_DIR, DATA_DIR, CACHE_FILE, SCANNED_FILE, INDEX_FILE
+    ROOT_DIR = Path(root)
+    DATA_DIR = ROOT_DIR / 'src' / 'data'
+    CACHE_FILE = ROOT_DIR / '.ccw' / 'sync-cache.json'
+    SCANNED_FILE = ROOT_DIR / 'public' / 'commands-scanned.json'
+    INDEX_FILE = ROOT_DIR / '.ccw' / 'command-index.sqlite'
+
+# ============================================
+# 性能剖析
+# ============================================
+
+class Profiler:
+    """分阶段计时与计数器
+
+    span() 标记一个阶段，count() 累加当前线程所在阶段的计数器（stat 次数、访问目录数、
+    读取字节数、正则匹配数等），子阶段结束时计数器并入父阶段。
+    结果可输出为汇总表或 Chrome trace-event JSON（chrome://tracing、Perfetto 可直接加载）。
+    """
 
-    return commands
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: List[Dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> List[Dict]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self) -> Optional[Dict]:
+        """当前线程所在的阶段（跨线程时作为子阶段的 parent 传入）"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Dict] = None):
+        stack = self._stack()
+        if parent is None and stack:
+            parent = stack[-1]
+        frame = {'name': name, 'counters': {}}
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                self.events.append({
+                    'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6,
+                    'args': dict(frame['counters']),
+                })
+                if parent is not None:
+                    counters = parent['counters']
+                    for key, n in frame['counters'].items():
+                        counters[key] = counters.get(key, 0) + n
+
+    def count(self, key: str, n: int = 1):
+        stack = self._stack()
+        if stack:
+            counters = stack[-1]['counters']
+            counters[key] = counters.get(key, 0) + n
+
+    def counted(self, iterable, key: str):
+        """透传可迭代对象，结束时把元素个数计入 key"""
+        n = 0
+        try:
+            for item in iterable:
+                n += 1
+                yield item
+        finally:
+            self.count(key, n)
+
+    def summary(self) -> List[Dict]:
+        """按阶段名汇总：调用次数、总耗时（毫秒）和计数器，按首次出现顺序排列"""
+        rows: Dict[str, Dict] = {}
+        for event in sorted(self.events, key=lambda e: e['ts']):
+            row = rows.setdefault(event['name'], {'name': event['name'], 'calls': 0, 'ms': 0.0, 'counters': {}})
+            row['calls'] += 1
+            row['ms'] += event['dur'] / 1000
+            for key, n in event['args'].items():
+                row['counters'][key] = row['counters'].get(key, 0) + n
+        return list(rows.values())
+
+    def print_summary(self, file=None):
+        file = file or sys.stderr
+        print(f"\n{'阶段':28} {'次数':>6} {'耗时(ms)':>10}  计数器", file=file)
+        for row in self.summary():
+            counters = ', '.join(f'{k}={v}' for k, v in sorted(row['counters'].items()))
+            print(f"{row['name']:30} {row['calls']:6} {row['ms']:10.2f}  {counters}", file=file)
+
+    def write_trace(self, path: Path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+# 未启用剖析时所有埋点只做一次全局变量判断
+_PROFILER: Optional[Profiler] = None
+_NULL_SPAN = nullcontext()
+
+def enable_profiling() -> Profiler:
+    """启用剖析并返回收集器（基准测试也通过它获取各阶段数据）"""
+    global _PROFILER
+    _PROFILER = Profiler()
+    return _PROFILER
+
+def disable_profiling():
+    global _PROFILER
+    _PROFILER = None
+
+def _span(name: str, parent: Optional[Dict] = None):
+    return _PROFILER.span(name, parent) if _PROFILER is not None else _NULL_SPAN
+
+def _count(key: str, n: int = 1):
+    if _PROFILER is not None:
+        _PROFILER.count(key, n)
+
+
+# ============================================
+# 扫描缓存
+# ============================================
+
+class ScanCache:
+    """基于目录 mtime 和文件内容哈希的扫描缓存
+
+    - 目录扫描：记录扫描时访问过的每个目录的 mtime，全部未变化则复用结果
+    - 数据文件：先比较 size + mtime，变化时再比较 sha256，内容未变则复用解析结果
+    """
+
+    def __init__(self, path: Optional[Path] = None, enabled: bool = True, rebuild: bool = False,
+                 persist: bool = True):
+        """
+        Args:
+            path: 缓存清单路径，默认 CACHE_FILE
+            enabled: 是否启用缓存（False 时每次都完整扫描）
+            rebuild: 忽略磁盘上已有的缓存清单
+            persist: 是否读写磁盘清单（False 时仅作为进程内缓存）
+        """
+        self.path = path or CACHE_FILE
+        self.enabled = enabled
+        self.persist = persist
+        self.dirty = False
+        self.entries: Dict[str, Dict] = {}
+        # 本进程内缓存依赖的所有目录与文件路径，供监视模式轮询
+        self.watched: Set[str] = set()
+        if enabled and persist and not rebuild:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(manifest, dict) or manifest.get('version') != CACHE_VERSION \
+                or manifest.get('root') != str(ROOT_DIR):
+            # 格式不兼容，或清单来自另一个检出目录（缓存中记录的是绝对路径），整体丢弃
+            self.dirty = True
+            return
+        entries = manifest.get('entries')
+        if isinstance(entries, dict):
+            self.entries = entries
+
+    def save(self):
+        """写回缓存清单（先写临时文件再替换，避免中断产生半截文件）"""
+        if not self.enabled or not self.persist or not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'root': str(ROOT_DIR), 'entries': self.entries}, f,
+                          ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+        self.dirty = False
+
+    def cached_dir_scan(self, key: str, scan: Callable[[], Tuple[Any, List[str]]],
+                        encode: Callable = lambda v: v, decode: Callable = lambda v: v) -> Any:
+        """目录扫描缓存
+
+        Args:
+            key: 缓存键
+            scan: 执行实际扫描，返回 (结果, 访问过的目录列表)
+            encode/decode: 结果与 JSON 可序列化形式之间的转换
+        """
+        if not self.enabled:
+            return scan()[0]
+
+        entry = self.entries.get(key)
+        if entry and entry.get('kind') == 'dir' and self._dirs_unchanged(entry.get('dirs')):
+            self.watched.update(entry['dirs'])
+            _count('cache_hits')
+            return decode(entry['value'])
+
+        _count('cache_misses')
+        value, visited = scan()
+        self.watched.update(visited)
+        self.entries[key] = {
+            'kind': 'dir',
+            'dirs': {d: self._trusted_mtime(d) for d in visited},
+            'value': encode(value),
+        }
+        self.dirty = True
+        return value
+
+    def cached_file_parse(self, key: str, path: Path, parse: Callable[[str], Any],
+                          encode: Callable = lambda v: v, decode: Callable = lambda v: v,
+                          errors: str = 'strict') -> Any:
+        """数据文件解析缓存（parse 接收文件文本内容，errors 为 UTF-8 解码的错误处理方式）"""
+        self.watched.add(str(path))
+        _count('stat_calls')
+        try:
+            st = path.stat()
+        except OSError:
+            return parse('')
+
+        entry = self.entries.get(key) if self.enabled else None
+        if entry and entry.get('kind') == 'file' and entry.get('size') == st.st_size \
+                and entry.get('mtime') == st.st_mtime_ns:
+            _count('cache_hits')
+            return decode(entry['value'])
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        _count('bytes_read', len(raw))
+        value = self.cached_content_parse(key, raw, parse, encode=encode, decode=decode, errors=errors)
+        if self.enabled:
+            entry = self.entries[key]
+            mtime = self._trusted_mtime_ns(st.st_mtime_ns)
+            if entry.get('size') != st.st_size or entry.get('mtime') != mtime:
+                entry.update(size=st.st_size, mtime=mtime)
+                self.dirty = True
+        return value
+
+    def cached_content_parse(self, key: str, raw: bytes, parse: Callable[[str], Any],
+                             encode: Callable = lambda v: v, decode: Callable = lambda v: v,
+                             errors: str = 'strict') -> Any:
+        """按内容 sha256 缓存解析结果（内容不直接来自工作区文件时使用，如 git 暂存区）"""
+        if not self.enabled:
+            return parse(raw.decode('utf-8', errors))
+
+        digest = hashlib.sha256(raw).hexdigest()
+        entry = self.entries.get(key)
+        if entry and entry.get('kind') == 'file' and entry.get('sha256') == digest:
+            _count('cache_hits')
+            return decode(entry['value'])
+
+        _count('cache_misses')
+        value = parse(raw.decode('utf-8', errors))
+        self.entries[key] = {'kind': 'file', 'sha256': digest, 'value': encode(value)}
+        self.dirty = True
+        return value
+
+    @staticmethod
+    def _trusted_mtime_ns(mtime_ns: int) -> Optional[int]:
+        # 刚修改过的条目在同一时间粒度内可能再次变化而 mtime 不变，不记录
+        if time.time_ns() - mtime_ns < RACY_MTIME_NS:
+            return None
+        return mtime_ns
+
+    def _trusted_mtime(self, directory: str) -> Optional[int]:
+        _count('stat_calls')
+        try:
+            return self._trusted_mtime_ns(os.stat(directory).st_mtime_ns)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _dirs_unchanged(dirs: Optional[Dict[str, Optional[int]]]) -> bool:
+        if not isinstance(dirs, dict):
+            return False
+        for d, mtime in dirs.items():
+            if mtime is None:
+                return False
+            _count('stat_calls')
+            try:
+                if os.stat(d).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+# ============================================
+# 目录扫描
+# ============================================
+
+class CommandEntry(NamedTuple):
+    """目录扫描得到的一条命令记录"""
+    name: str      # 命令名，如 /workflow:plan
+    source: str    # 来源根，如 claude/commands
+    rel_path: str  # 相对来源根目录的路径（/ 分隔）
+    kind: str      # 'file' 或 'dir'
+    # 一次遍历同时服务同步检查与命令清单，两者的收录规则不同，逐条记录：
+    synced: bool = True  # 参与同步检查（不在 agent 目录下、不以 _ 开头、不在 EXCLUDED_SKILLS 中）
+    listed: bool = True  # 收入命令清单（与 scan-commands.js 一致，不收录符号链接的技能目录）
 
 # 排除列表：这些技能是同步工具本身，不应被检测
 EXCLUDED_SKILLS = {
     'ccw-wiki-sync',  # 百科同步技能，不应出现在百科数据中
 }
 
-def get_claude_skills() -> Set[str]:
-    """扫描 .claude/skills 目录
+def _walk_commands_tree(root_dir: str) -> Tuple[List[CommandEntry], List[str]]:
+    """递归扫描 .claude/commands：a/b/c.md -> /a:b:c（agent 目录下的命令不参与同步检查）"""
+    entries = []
+    visited = [root_dir]
+    stack = [(root_dir, '', True)]
+    seen = scanned = 0
+
+    while stack:
+        current, prefix, synced = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+        scanned += 1
+        with it:
+            for entry in it:
+                seen += 1
+                if entry.is_dir():
+                    # 与 os.walk 一致：不跟随目录符号链接
+                    if not entry.is_symlink():
+                        visited.append(entry.path)
+                        stack.append((entry.path, prefix + entry.name + '/', synced and entry.name != 'agent'))
+                elif entry.name.endswith('.md'):
+                    rel_path = prefix + entry.name
+                    entries.append(CommandEntry('/' + rel_path[:-3].replace('/', ':'),
+                                                'claude/commands', rel_path, 'file', synced))
+
+    _count('dirs_visited', scanned)
+    _count('dir_entries', seen)
+    return entries, visited
+
+def _list_entries(root_dir: str, source: str, want_dir: bool,
+                  excluded: Set[str] = frozenset()) -> Tuple[List[CommandEntry], List[str]]:
+    """扫描单层目录：want_dir=True 时收集子目录（技能），否则收集 .md 文件（提示词）"""
+    entries = []
+    try:
+        it = os.scandir(root_dir)
+    except OSError:
+        return entries, [root_dir]
+
+    seen = 0
+    with it:
+        for entry in it:
+            seen += 1
+            name = entry.name
+            if want_dir:
+                if not entry.is_dir():
+                    continue
+                # 同步检查排除 _ 开头的目录和排除列表中的技能；命令清单跳过符号链接
+                entries.append(CommandEntry('/' + name, source, name, 'dir',
+                                            not name.startswith('_') and name not in excluded,
+                                            not entry.is_symlink()))
+            elif name.endswith('.md'):
+                entries.append(CommandEntry('/' + name[:-3], source, name, 'file'))
+
+    _count('dirs_visited')
+    _count('dir_entries', seen)
+    return entries, [root_dir]
+
+# 来源根：(来源名, 相对 ROOT_DIR 的路径, 扫描函数)，顺序即同名命令的来源优先级
+SCAN_ROOTS: List[Tuple[str, Tuple[str, ...], Callable[[str], Tuple[List[CommandEntry], List[str]]]]] = [
+    ('claude/commands', ('.claude', 'commands'), _walk_commands_tree),
+    ('claude/skills', ('.claude', 'skills'),
+     lambda d: _list_entries(d, 'claude/skills', True, EXCLUDED_SKILLS)),
+    ('codex/prompts', ('.codex', 'prompts'),
+     lambda d: _list_entries(d, 'codex/prompts', False)),
+    ('codex/skills', ('.codex', 'skills'),
+     lambda d: _list_entries(d, 'codex/skills', True)),
+]
+
+def walk_root(source: str, cache: Optional[ScanCache] = None) -> List[CommandEntry]:
+    """遍历单个来源根目录，返回带 synced/listed 标记的全部记录"""
+    for name, parts, walker in SCAN_ROOTS:
+        if name == source:
+            break
+    else:
+        raise ValueError(f'未知来源: {source}')
 
-    注意：排除 EXCLUDED_SKILLS 中的技能（同步工具自身）
-    """
-    skills = set()
-    skills_dir = ROOT_DIR / '.claude' / 'skills'
+    root_dir = str(ROOT_DIR.joinpath(*parts))
+    if cache is None:
+        return walker(root_dir)[0]
+    return cache.cached_dir_scan(
+        source, lambda: walker(root_dir),
+        encode=lambda entries: [[e.name, e.rel_path, e.kind, e.synced, e.listed] for e in entries],
+        decode=lambda rows: [CommandEntry(n, source, r, k, sy, li) for n, r, k, sy, li in rows],
+    )
 
-    if not skills_dir.exists():
-        return skills
+def scan_root(source: str, cache: Optional[ScanCache] = None) -> List[CommandEntry]:
+    """扫描单个来源根目录（只含参与同步检查的记录）"""
+    return [e for e in walk_root(source, cache) if e.synced]
 
-    for item in os.listdir(skills_dir):
-        item_path = skills_dir / item
-        # 排除 _ 开头的目录和 EXCLUDED_SKILLS 中的技能
-        if item_path.is_dir() and not item.startswith('_') and item not in EXCLUDED_SKILLS:
-            skills.add('/' + item)
+def walk_all(cache: Optional[ScanCache] = None) -> Dict[str, List[CommandEntry]]:
+    """并发遍历全部来源根目录
 
-    return skills
+    Returns:
+        Dict[str, List[CommandEntry]]: {来源名: 带 synced/listed 标记的全部记录}，
+        由 sync_view 与 build_scanned_commands 各自筛选
+    """
+    with _span('scan') as parent:
+        def run(source: str) -> List[CommandEntry]:
+            # 工作线程中的子阶段显式挂到 scan 下
+            with _span('scan:' + source, parent):
+                return walk_root(source, cache)
 
-def get_codex_prompts() -> Set[str]:
-    """扫描 .codex/prompts 目录"""
-    prompts = set()
-    prompts_dir = ROOT_DIR / '.codex' / 'prompts'
+        with ThreadPoolExecutor(max_workers=len(SCAN_ROOTS)) as pool:
+            futures = {name: pool.submit(run, name) for name, _, _ in SCAN_ROOTS}
+            return {name: future.result() for name, future in futures.items()}
+
+def sync_view(walk: Dict[str, List[CommandEntry]]) -> Dict[str, List[CommandEntry]]:
+    """从遍历结果中筛选参与同步检查的记录"""
+    return {source: [e for e in entries if e.synced] for source, entries in walk.items()}
 
-    if not prompts_dir.exists():
-        return prompts
+def scan_all(cache: Optional[ScanCache] = None) -> Dict[str, List[CommandEntry]]:
+    """并发扫描全部来源根目录
 
-    for f in os.listdir(prompts_dir):
-        if f.endswith('.md'):
-            cmd = '/' + f.replace('.md', '')
-            prompts.add(cmd)
+    Returns:
+        Dict[str, List[CommandEntry]]: {来源名: 参与同步检查的命令记录列表}
+    """
+    return sync_view(walk_all(cache))
 
-    return prompts
+def build_command_index(scans: Dict[str, List[CommandEntry]]) -> Dict[str, CommandEntry]:
+    """合并扫描结果为 {命令名: 记录}，同名命令按 SCAN_ROOTS 顺序取优先来源"""
+    index = {}
+    for name, _, _ in SCAN_ROOTS:
+        for entry in scans.get(name, ()):
+            index.setdefault(entry.name, entry)
+    return index
 
-def get_codex_skills() -> Set[str]:
-    """扫描 .codex/skills 目录"""
-    skills = set()
-    skills_dir = ROOT_DIR / '.codex' / 'skills'
+def get_claude_commands(cache: Optional[ScanCache] = None) -> Set[str]:
+    """扫描 .claude/commands 目录"""
+    return {e.name for e in scan_root('claude/commands', cache)}
 
-    if not skills_dir.exists():
-        return skills
+def get_claude_skills(cache: Optional[ScanCache] = None) -> Set[str]:
+    """扫描 .claude/skills 目录
 
-    for item in os.listdir(skills_dir):
-        item_path = skills_dir / item
-        if item_path.is_dir() and not item.startswith('_'):
-            skills.add('/' + item)
+    注意：排除 EXCLUDED_SKILLS 中的技能（同步工具自身）
+    """
+    return {e.name for e in scan_root('claude/skills', cache)}
 
-    return skills
+def get_codex_prompts(cache: Optional[ScanCache] = None) -> Set[str]:
+    """扫描 .codex/prompts 目录"""
+    return {e.name for e in scan_root('codex/prompts', cache)}
 
-def get_ts_commands() -> Tuple[Set[str], Set[str]]:
-    """从 commands.ts 提取已定义的命令和废弃命令
+def get_codex_skills(cache: Optional[ScanCache] = None) -> Set[str]:
+    """扫描 .codex/skills 目录"""
+    return {e.name for e in scan_root('codex/skills', cache)}
+
+# ============================================
+# 数据文件解析
+# ============================================
+
+class TsParseError(ValueError):
+    """数据文件语法无法识别（未闭合的字符串/注释/括号等）"""
+
+    def __init__(self, message: str, line: int, col: int, file: str = ''):
+        self.message = message
+        self.line = line
+        self.col = col
+        self.file = file
+        super().__init__(message)
+
+    def __str__(self):
+        return f"{self.file or '<ts>'}:{self.line}:{self.col}: {self.message}"
+
+class TsObject(NamedTuple):
+    """对象字面量中的简单字段（字符串/数字/布尔/null）及其起始位置（行列均从 1 开始）"""
+    fields: Dict[str, Any]
+    line: int
+    col: int
+
+class Command(NamedTuple):
+    """commands.ts 中的命令定义（对应 types.ts 的 Command）"""
+    cmd: str
+    desc: str
+    status: str
+    category: str
+    cli: str
+    line: int
+    col: int
+
+class DeprecatedCommand(NamedTuple):
+    """deprecated.ts 中的废弃命令（对应 types.ts 的 DeprecatedCommand）"""
+    old: str
+    new_cmd: Optional[str]
+    reason: str
+    deprecated_in: str
+    line: int
+    col: int
+
+class PatternStep(NamedTuple):
+    """patterns.ts 命令链中的一步"""
+    cmd: str
+    desc: str
+    line: int
+    col: int
+
+# 空白与注释，以及字符串字面量：均写成展开循环形式（[^x]*(?:y[^x]*)*），
+# 每个字符只走一条分支，比逐字符二选一的写法快数倍，失败回溯时也不会成倍尝试
+_TS_SKIP = r'\s*(?:(?://[^\n]*(?![^\n])|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)\s*)*'
+_TS_STR = r"""'[^'\\\n]*(?:\\.[^'\\\n]*)*'|"[^"\\\n]*(?:\\.[^"\\\n]*)*" """.rstrip()
+_TS_NUM = r'0[xX][0-9a-fA-F_]+|\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?'
+_TS_LIT = r'true|false|null|-?(?:' + _TS_NUM + r')'
+# 简单字段 key: 'value'（值为字符串/数字/布尔/null），连同其后的逗号
+_TS_FIELD = (r'(?:(?P<fkey>[^\W\d][\w$]*)|(?P<fqkey>' + _TS_STR + r'))\s*:\s*'
+             r'(?:(?P<fstr>' + _TS_STR + r')|(?P<flit>' + _TS_LIT + r'))'
+             r'(?=\s*[,}])(?:\s*,)?')
+_TS_ANY_FIELD = re.sub(r'\(\?P<\w+>', '(?:', _TS_FIELD)
+# 从 object token 中依次取出字段
+_TS_FIELD_RE = re.compile(_TS_SKIP + _TS_FIELD, re.DOTALL)
+
+def _ts_object_source(keys: Tuple[str, ...]) -> str:
+    """只含简单字段的对象字面量的正则源码
+
+    keys 非空时同时以 k_<键> 组捕获这些字段的原始值：重复的捕获组保留最后一次匹配，
+    与 JS 对象字面量中同名字段以最后一个为准一致。
+    """
+    captured = ''.join(r"""(?:%s|'%s'|"%s")\s*:\s*(?P<k_%s>%s|%s)(?=\s*[,}])(?:\s*,)?|"""
+                       % (key, key, key, key, _TS_STR, _TS_LIT) for key in keys)
+    return r'\{' + _TS_SKIP + r'(?:(?:' + captured + _TS_ANY_FIELD + r')' + _TS_SKIP + r')*\}'
 
-    Returns:
-        Tuple[Set[str], Set[str]]: (活跃命令, 废弃命令的旧名称)
+@lru_cache(maxsize=None)
+def _ts_token_re(keys: Tuple[str, ...] = ()) -> 're.Pattern':
+    """编译分词正则
+
+    只含简单字段的对象字面量（连同其后的逗号）整体作为一个 object token，数据文件中绝大多数
+    对象走这条快速路径，一次匹配即可跳过。
+    """
+    return re.compile(
+        _TS_SKIP + r'(?:'
+        r'(?P<object>' + _ts_object_source(keys) + r')(?:\s*,)?'
+        r'|(?P<field>' + _TS_FIELD + r')'  # 其余对象中的简单字段同样整体作为一个 token
+        r'|(?P<str>' + _TS_STR + r')'
+        r'|(?P<ident>[^\W\d][\w$]*|\$[\w$]*)'
+        r'|(?P<num>' + _TS_NUM + r'|\.\d+)'
+        r"""|(?P<punct>=>|\.\.\.|\?\.|[^\s\w/`'"$])"""
+        r"""|(?P<special>[/`'"])"""
+        r')?', re.DOTALL)
+
+@lru_cache(maxsize=None)
+def _ts_skim_re(keys: Tuple[str, ...]) -> 're.Pattern':
+    """编译跳读正则：括号与只含简单字段的对象之间的代码、字符串、注释和无插值模板字符串整段吞掉"""
+    return re.compile(
+        r'(?:[^\'"`/{}\[\]()]+|' + _TS_STR + r'|`[^`\\$]*(?:(?:\\.|\$(?!\{))[^`\\$]*)*`'
+        r'|//[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/)*'
+        r'(?:(?P<object>' + _ts_object_source(keys) + r')'
+        r'|(?P<open>[{[(])|(?P<close>[}\])])'
+        r"""|(?P<special>[/`'"]))?""", re.DOTALL)
+
+_TS_REGEX_RE = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+_TS_TEMPLATE_RE = re.compile(r'`(?:[^`\\$]|\\.|\$(?!\{))*`', re.DOTALL)
+_TS_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0', '\n': ''}
+_TS_ESCAPE_RE = re.compile(r'\\(u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)', re.DOTALL)
+# 这些 token 之后出现的 / 是正则字面量而非除号
+_TS_REGEX_PREFIX = set('([{,;:=!&|?+-*%~<>') | {'return', 'typeof', 'case', 'of', 'in', '=>', None}
+_TS_CLOSERS = {'}': '{', ']': '[', ')': '('}
+_TS_LITERALS = {'true': True, 'false': False, 'null': None}
+
+def _ts_unescape(match: 're.Match') -> str:
+    esc = match.group(1)
+    if esc[0] == 'u' and len(esc) > 1:
+        return chr(int(esc[2:-1] if esc[1] == '{' else esc[1:], 16))
+    if esc[0] == 'x' and len(esc) == 3:
+        return chr(int(esc[1:], 16))
+    return _TS_ESCAPES.get(esc, esc)
+
+def _ts_number(text: str) -> Any:
+    text = text.replace('_', '')
+    try:
+        return int(text, 0)
+    except ValueError:
+        return float(text)
+
+def _ts_string_value(raw: str) -> str:
+    body = raw[1:-1]
+    return _TS_ESCAPE_RE.sub(_ts_unescape, body) if '\\' in body else body
+
+class _LineCounter:
+    """偏移量 -> (行, 列)，要求按非递减顺序查询，整体只扫描一遍换行符"""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.offset = 0
+        self.line = 1
+        self.line_start = 0
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        if offset < self.offset:
+            line = self.content.count('\n', 0, offset) + 1
+            return line, offset - (self.content.rfind('\n', 0, offset) + 1) + 1
+        newlines = self.content.count('\n', self.offset, offset)
+        if newlines:
+            self.line += newlines
+            self.line_start = self.content.rfind('\n', self.offset, offset) + 1
+        self.offset = offset
+        return self.line, offset - self.line_start + 1
+
+def _ts_error(content: str, message: str, offset: int) -> TsParseError:
+    return TsParseError(message, *_LineCounter(content).position(offset))
+
+def _ts_field_item(match: 're.Match') -> Tuple[str, Any]:
+    """简单字段匹配 -> (键, 值)"""
+    fstr = match.group('fstr')
+    if fstr is not None:
+        value = _ts_string_value(fstr)
+    else:
+        flit = match.group('flit')
+        value = _TS_LITERALS[flit] if flit in _TS_LITERALS else _ts_number(flit)
+    return match.group('fkey') or _ts_string_value(match.group('fqkey')), value
+
+def _ts_raw_value(raw: str) -> Any:
+    """简单字段值的源码 -> 字符串/数字/布尔/null"""
+    if raw[0] in '\'"':
+        return _ts_string_value(raw)
+    return _TS_LITERALS[raw] if raw in _TS_LITERALS else _ts_number(raw)
+
+def _ts_object_fields(content: str, start: int, stop: int) -> Dict[str, Any]:
+    """object token（content[start:stop]，只含简单字段）-> 全部字段的字典"""
+    unquote = _ts_string_value
+    if content.find('//', start, stop) < 0 and content.find('/*', start, stop) < 0:
+        # 没有注释时字段首尾相接，findall 在 C 层一次取出全部字段
+        items = _TS_FIELD_RE.findall(content, start + 1, stop)
+    else:
+        # 有注释时逐个从上一字段末尾匹配，避免匹配到末尾注释里形似字段的文本
+        items = []
+        field = _TS_FIELD_RE.match(content, start + 1, stop)
+        while field:
+            items.append(field.groups())
+            field = _TS_FIELD_RE.match(content, field.end(), stop)
+
+    fields = {}
+    for fkey, fqkey, fstr, flit in items:
+        if fstr:
+            value = unquote(fstr)
+        else:
+            value = _TS_LITERALS[flit] if flit in _TS_LITERALS else _ts_number(flit)
+        fields[fkey or unquote(fqkey)] = value
+    return fields
+
+def iter_ts_tokens(content: str, keys: Tuple[str, ...] = ()) -> Iterator[Tuple[str, Any, int]]:
+    """TS 源码的流式分词器，产出 (类型, 值, 偏移量)
+
+    类型为 object/field/str/num/ident/punct/regex/template；注释和空白被跳过。
+    为减少正则匹配次数和逐 token 的解释器开销：值为字符串/数字/布尔/null 的简单字段
+    `key: value,` 合并为一个 field token，值为 (键, 值)；只含简单字段的对象字面量合并为一个
+    object token，值为字段字典（指定 keys 时只含其中出现的字段），偏移量为其左花括号，
+    其后紧跟的逗号另行产出。
+    只覆盖数据文件用到的语法子集：字符串、模板字符串、正则字面量和普通代码都能正确跳过，
+    含 ${} 插值的模板字符串按原文产出。偏移量可用 _LineCounter 换算为行列。
     """
-    commands_file = DATA_DIR / 'commands.ts'
-    active_commands = set()
+    pos = 0
+    end = len(content)
+    prev = None  # 上一个有效 token（判断 / 是否开始正则字面量）
+    unquote = _ts_string_value
+    field_item = _ts_field_item
+    raw_value = _ts_raw_value
+    token_re = _ts_token_re(keys)
+    # 占位组保证 group() 总是返回元组
+    groups = ['k_' + key for key in keys] + [0]
+
+    while True:
+        # 绝大多数 token 由 finditer 连续产出；遇到模板字符串或 / 时按上下文处理后从新位置继续
+        for match in token_re.finditer(content, pos):
+            kind = match.lastgroup
+            if kind == 'object':
+                start, stop = match.span(kind)
+                if keys:
+                    fields = {key: raw_value(raw) for key, raw in zip(keys, match.group(*groups)) if raw}
+                else:
+                    fields = _ts_object_fields(content, start, stop)
+                yield kind, fields, start
+                if match.end() > stop:
+                    yield 'punct', ',', match.end() - 1
+                    prev = ','
+                else:
+                    prev = '}'
+            elif kind == 'field':
+                yield kind, field_item(match), match.start(kind)
+                prev = 'field'
+            elif kind == 'str':
+                yield kind, unquote(match.group(kind)), match.start(kind)
+                prev = 'str'
+            elif kind == 'special':
+                break
+            elif kind is None:
+                if match.end() >= end:
+                    return
+                raise _ts_error(content, '无法识别的字符', match.end())
+            else:
+                text = match.group(kind)
+                yield kind, text, match.start(kind)
+                prev = text if kind != 'num' else 'num'
+        else:
+            return
+
+        start = match.start(kind)
+        ch = content[start]
+        if ch == '`':
+            template = _TS_TEMPLATE_RE.match(content, start)
+            pos = template.end() if template else _ts_skip_template(content, start)
+            yield 'template', content[start + 1:pos - 1], start
+            prev = 'template'
+        elif ch == '/':
+            if content.startswith('/*', start):
+                raise _ts_error(content, '未闭合的块注释', start)
+            regex = _TS_REGEX_RE.match(content, start) if prev in _TS_REGEX_PREFIX else None
+            if regex:
+                pos = regex.end()
+                yield 'regex', regex.group(), start
+                prev = 'regex'
+            else:
+                pos = start + 1
+                yield 'punct', '/', start
+                prev = '/'
+        else:
+            raise _ts_error(content, '未闭合的字符串', start)
+
+def _ts_skip_template(content: str, pos: int) -> int:
+    """跳过含 ${} 插值的模板字符串，返回闭合反引号之后的位置"""
+    depth = 0
+    i = pos + 1
+    end = len(content)
+    while i < end:
+        ch = content[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if depth == 0:
+            if ch == '`':
+                return i + 1
+            if content.startswith('${', i):
+                depth = 1
+                i += 2
+                continue
+        else:
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+            elif ch in '\'"`':
+                # 插值表达式内的字符串，直接跳过
+                close = content.find(ch, i + 1)
+                if close < 0:
+                    break
+                i = close
+        i += 1
+    raise _ts_error(content, '未闭合的模板字符串', pos)
+
+def iter_ts_objects(content: str, keys: Tuple[str, ...] = ()) -> Iterator[TsObject]:
+    """单遍扫描 TS 源码，按闭合顺序产出每个对象字面量的简单字段
+
+    字段顺序、引号风格、换行均不影响识别；值为数组/对象/表达式的字段被忽略，
+    但其内部的对象字面量仍会单独产出。指定 keys 时调用方只关心这些字段：每个对象只取出
+    其中出现的字段，没有任何一个时不产出；此时先走跳读快速路径，遇到它不处理的语法再完整分词。
+    """
+    if keys:
+        objects = _skim_ts_objects(content, keys)
+        if objects is not None:
+            return iter(objects)
+    return _iter_ts_objects(content, keys)
+
+def _skim_ts_objects(content: str, keys: Tuple[str, ...]) -> Optional[List[TsObject]]:
+    """iter_ts_objects 指定 keys 时的快速路径
+
+    只逐个处理括号和只含简单字段的对象，其间的代码一次匹配整段跳过。含复杂值的对象记下
+    自身层级的源码（子括号内容折叠为空括号），其中出现 keys 时再交给完整分词取字段。
+    遇到正则字面量、除号、带插值的模板字符串或任何语法错误时返回 None，
+    由完整分词给出同样的结果或准确的错误位置。
+    """
+    skim_re = _ts_skim_re(keys)
+    raw_value = _ts_raw_value
+    # 占位组保证 group() 总是返回元组
+    groups = ['k_' + key for key in keys] + [0]
+    lines = _LineCounter(content)
+    objects: List[TsObject] = []
+    # 栈帧：(开括号, 开括号处 (行, 列), 外层对象的源码片段)；own 为当前对象自身层级的源码片段
+    stack: List[tuple] = []
+    own: Optional[List[str]] = None
+    matches = 0
+
+    for match in skim_re.finditer(content):
+        matches += 1
+        kind = match.lastgroup
+        if own is not None:
+            own.append(content[match.start():match.start(kind) if kind else match.end()])
+        if kind == 'object':
+            fields = {key: raw_value(raw) for key, raw in zip(keys, match.group(*groups)) if raw}
+            if fields:
+                objects.append(TsObject(fields, *lines.position(match.start(kind))))
+            if own is not None:
+                own.append('{}')
+        elif kind == 'open':
+            opener = match.group(kind)
+            stack.append((opener, lines.position(match.start(kind)) if opener == '{' else None, own))
+            own = [] if opener == '{' else None
+        elif kind == 'close':
+            closer = match.group(kind)
+            if not stack or stack[-1][0] != _TS_CLOSERS[closer]:
+                return None
+            opener, position, parent = stack.pop()
+            if own is not None:
+                body = ''.join(own)
+                if '\\' in body or any(key in body for key in keys):
+                    for obj in _iter_ts_objects('{' + body + '}', keys):
+                        objects.append(obj._replace(line=position[0], col=position[1]))
+            own = parent
+            if own is not None:
+                own.append(opener + closer)
+        elif kind == 'special':
+            return None
+
+    if stack:
+        return None
+    _count('regex_matches', matches)
+    return objects
+
+def _iter_ts_objects(content: str, keys: Tuple[str, ...] = ()) -> Iterator[TsObject]:
+    """iter_ts_objects 的完整分词实现"""
+    tokens = iter_ts_tokens(content, keys)
+    if _PROFILER is not None:
+        tokens = _PROFILER.counted(tokens, 'regex_matches')
+    lines = _LineCounter(content)
+    # 栈帧：[开括号, 字段, 偏移量, (行, 列)]；当前对象帧的解析状态保存在 state/key/value 中
+    stack: List[list] = []
+    in_object = False
+    state = key = value = None
+    saved: List[tuple] = []  # 外层对象帧的 (state, key, value)
+
+    for kind, text, offset in tokens:
+        if kind == 'object':
+            if text:
+                yield TsObject(text, *lines.position(offset))
+            if in_object:
+                # 作为外层字段的值，该字段忽略
+                state = 'other'
+            continue
+
+        if kind == 'punct':
+            if text in ('{', '[', '('):
+                if in_object:
+                    saved.append(('other', key, value))
+                stack.append([text, {}, offset, lines.position(offset) if text == '{' else None])
+                in_object = text == '{'
+                state, key, value = 'key', None, None
+                continue
+
+            if text in _TS_CLOSERS:
+                if not stack or stack[-1][0] != _TS_CLOSERS[text]:
+                    raise TsParseError(f'不匹配的 {text}', *lines.position(offset))
+                frame = stack.pop()
+                if frame[0] == '{':
+                    if state == 'after_value':
+                        frame[1][key] = value
+                    fields = frame[1]
+                    if keys:
+                        fields = {k: fields[k] for k in keys if k in fields}
+                    if fields:
+                        yield TsObject(fields, *frame[3])
+                in_object = bool(stack) and stack[-1][0] == '{'
+                if in_object:
+                    state, key, value = saved.pop()
+                continue
+
+        if not in_object:
+            continue
+
+        if kind == 'punct' and text == ',':
+            if state == 'after_value':
+                stack[-1][1][key] = value
+            state = 'key'
+        elif kind == 'field':
+            # field token 已包含其后的逗号（或紧跟 }），直接提交
+            if state == 'key':
+                stack[-1][1][text[0]] = text[1]
+            else:
+                # 复杂值的尾部形如 `x : 'y',`（如三元表达式），逗号已被吞掉，
+                # 当前字段到此结束，下一个 token 开始新字段
+                state = 'key'
+        elif state == 'key' and kind in ('ident', 'str', 'num'):
+            state, key = 'colon', text
+        elif state == 'colon' and kind == 'punct' and text == ':':
+            state = 'value'
+        elif state == 'value' and kind in ('str', 'num', 'template'):
+            if kind == 'num':
+                state, value = 'after_value', _ts_number(text)
+            elif kind == 'template' and '${' in text:
+                state = 'other'
+            else:
+                state, value = 'after_value', text
+        elif state == 'value' and kind == 'ident' and text in _TS_LITERALS:
+            state, value = 'after_value', _TS_LITERALS[text]
+        else:
+            state = 'other'
+
+    if stack:
+        frame = stack[-1]
+        raise _ts_error(content, f'未闭合的 {frame[0]}', frame[2])
+
+def _str_field(fields: Dict[str, Any], key: str) -> str:
+    value = fields.get(key)
+    return value if isinstance(value, str) else ''
+
+def parse_commands_ts(content: str) -> List[Command]:
+    """解析 commands.ts 中的命令定义"""
+    return [
+        Command(obj.fields['cmd'], _str_field(obj.fields, 'desc'), _str_field(obj.fields, 'status'),
+                _str_field(obj.fields, 'category'), _str_field(obj.fields, 'cli'), obj.line, obj.col)
+        for obj in iter_ts_objects(content, ('cmd', 'desc', 'status', 'category', 'cli'))
+        if _str_field(obj.fields, 'cmd').startswith('/')
+    ]
+
+def parse_deprecated_ts(content: str) -> List[DeprecatedCommand]:
+    """解析 deprecated.ts 中的废弃命令"""
+    records = []
+    for obj in iter_ts_objects(content, ('old', 'newCmd', 'reason', 'deprecatedInVersion')):
+        old = _str_field(obj.fields, 'old')
+        if not old.startswith('/'):
+            continue
+        new_cmd = obj.fields.get('newCmd')
+        records.append(DeprecatedCommand(
+            old, new_cmd if isinstance(new_cmd, str) and new_cmd else None,
+            _str_field(obj.fields, 'reason'), _str_field(obj.fields, 'deprecatedInVersion'),
+            obj.line, obj.col))
+    return records
+
+def parse_pattern_steps(content: str) -> List[PatternStep]:
+    """解析 patterns.ts 命令链中的每一步"""
+    return [
+        PatternStep(obj.fields['cmd'], _str_field(obj.fields, 'desc'), obj.line, obj.col)
+        for obj in iter_ts_objects(content, ('cmd', 'desc'))
+        if _str_field(obj.fields, 'cmd').startswith('/')
+    ]
+
+def _read_data_file(name: str, parse: Callable[[str], Any], cache: Optional[ScanCache],
+                    encode: Callable = lambda v: v, decode: Callable = lambda v: v) -> Any:
+    """读取并解析 src/data 下的数据文件，文件不存在时按空内容解析"""
+    path = DATA_DIR / name
+    if cache is None:
+        cache = ScanCache(enabled=False)
+    try:
+        with _span('parse:' + name):
+            return cache.cached_file_parse('data/' + name, path, parse, encode=encode, decode=decode)
+    except TsParseError as e:
+        e.file = f'src/data/{name}'
+        raise
+    except UnicodeDecodeError as e:
+        # 非 UTF-8 内容同样按解析失败处理，定位到第一个无法解码的字节
+        head = e.object[:e.start]
+        raise TsParseError('文件不是有效的 UTF-8', head.count(b'\n') + 1,
+                           e.start - head.rfind(b'\n'), f'src/data/{name}') from e
+
+def _record_codec(record_type: type) -> Dict[str, Callable]:
+    """NamedTuple 记录列表与缓存中 JSON 数组之间的转换"""
+    return {
+        'encode': lambda records: [list(r) for r in records],
+        'decode': lambda rows: [record_type(*row) for row in rows],
+    }
 
-    if commands_file.exists():
-        with open(commands_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+def load_ts_commands(cache: Optional[ScanCache] = None) -> List[Command]:
+    """解析 commands.ts，返回带源码位置的命令定义"""
+    return _read_data_file('commands.ts', parse_commands_ts, cache, **_record_codec(Command))
 
-        # 匹配 cmd: '/xxx' 格式
-        pattern = r"cmd: '(/[^']+)'"
-        active_commands = set(re.findall(pattern, content))
+def load_deprecated_commands(cache: Optional[ScanCache] = None) -> List[DeprecatedCommand]:
+    """解析 deprecated.ts，返回带源码位置的废弃命令"""
+    return _read_data_file('deprecated.ts', parse_deprecated_ts, cache, **_record_codec(DeprecatedCommand))
 
-    return active_commands
+def load_pattern_steps(cache: Optional[ScanCache] = None) -> List[PatternStep]:
+    """解析 patterns.ts，返回带源码位置的命令链步骤"""
+    return _read_data_file('patterns.ts', parse_pattern_steps, cache, **_record_codec(PatternStep))
 
-def get_deprecated_commands() -> Dict[str, str]:
-    """从 deprecated.ts 提取废弃命令
+def get_ts_commands(cache: Optional[ScanCache] = None) -> Set[str]:
+    """从 commands.ts 提取已定义的命令
 
     Returns:
-        Dict[str, str]: {旧命令: 替代命令或原因}
+        Set[str]: 活跃命令
     """
-    deprecated_file = DATA_DIR / 'deprecated.ts'
-    deprecated = {}
-
-    if deprecated_file.exists():
-        with open(deprecated_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+    return {c.cmd for c in load_ts_commands(cache)}
 
-        # 匹配 { old: '/xxx', newCmd: '/yyy' 或 null, reason: '...' }
-        pattern = r"\{\s*old:\s*'(/[^']+)',\s*newCmd:\s*(?:'(/[^']+)'|null),\s*reason:\s*'([^']+)'\s*\}"
-        for match in re.finditer(pattern, content):
-            old_cmd = match.group(1)
-            new_cmd = match.group(2) or 'removed'
-            deprecated[old_cmd] = new_cmd
+def get_deprecated_commands(cache: Optional[ScanCache] = None) -> Dict[str, str]:
+    """从 deprecated.ts 提取废弃命令
 
-    return deprecated
+    Returns:
+        Dict[str, str]: {旧命令: 替代命令或 'removed'}
+    """
+    return {d.old: d.new_cmd or 'removed' for d in load_deprecated_commands(cache)}
 
-def get_pattern_commands() -> Set[str]:
+def get_pattern_commands(cache: Optional[ScanCache] = None) -> Set[str]:
     """从 patterns.ts 提取命令链中引用的命令
 
     Returns:
         Set[str]: 命令链中引用的所有命令
     """
-    patterns_file = DATA_DIR / 'patterns.ts'
-    pattern_commands = set()
-
-    if patterns_file.exists():
-        with open(patterns_file, 'r', encoding='utf-8') as f:
-            content = f.read()
+    return {step.cmd for step in load_pattern_steps(cache)}
+
+# ============================================
+# 废弃规则索引
+# ============================================
+
+class Deprecation(NamedTuple):
+    """一个命令的废弃解析结果"""
+    rule: DeprecatedCommand   # 命中的废弃规则（精确或通配）
+    chain: Tuple[str, ...]    # 依次经过的替代命令
+    terminal: Optional[str]   # 最终替代命令，已移除或链条成环时为 None
+    cycle: bool               # 规则本身位于替代链的环上
+    into_cycle: bool = False  # 规则不在环上，但其替代链通向环
+
+class _DeprecationNode:
+    __slots__ = ('children', 'exact', 'wildcard')
+
+    def __init__(self):
+        self.children: Dict[str, '_DeprecationNode'] = {}
+        self.exact: Optional[DeprecatedCommand] = None     # 命令本身被废弃
+        self.wildcard: Optional[DeprecatedCommand] = None  # 命名空间下全部子命令被废弃（/ns:*）
+
+class DeprecationIndex:
+    """按 : 分段的废弃规则前缀树
+
+    - /a:b 精确匹配该命令，/a:b:* 匹配 /a:b: 下的任意子命令，精确规则优先，
+      否则取最深的通配规则
+    - 构建时预先计算每条规则沿替代命令到最终替代的传递闭包，并检测环，
+      查询只需沿前缀树走 O(深度) 步
+    """
 
-        # 匹配 cmd: '/xxx' 格式
-        pattern = r"cmd: '(/[^']+)'"
-        pattern_commands = set(re.findall(pattern, content))
+    def __init__(self, records: List[DeprecatedCommand]):
+        self.records = records
+        self.root = _DeprecationNode()
+        for record in records:
+            segments = record.old[1:].split(':')
+            wildcard = segments[-1] == '*'
+            if wildcard:
+                segments.pop()
+            node = self.root
+            for segment in segments:
+                node = node.children.setdefault(segment, _DeprecationNode())
+            # 同一命令重复登记时以先出现的为准
+            if wildcard:
+                node.wildcard = node.wildcard or record
+            else:
+                node.exact = node.exact or record
+
+        self.resolved: Dict[DeprecatedCommand, Deprecation] = {}
+        for record in records:
+            self._resolve(record)
+
+    def rule_for(self, cmd: str) -> Optional[DeprecatedCommand]:
+        """返回命中 cmd 的废弃规则"""
+        if not cmd.startswith('/'):
+            return None
+        node = self.root
+        matched = None
+        for segment in cmd[1:].split(':'):
+            if node.wildcard:
+                matched = node.wildcard
+            node = node.children.get(segment)
+            if node is None:
+                return matched
+        return node.exact or matched
+
+    def lookup(self, cmd: str) -> Optional[Deprecation]:
+        """cmd 未被废弃时返回 None"""
+        rule = self.rule_for(cmd)
+        return self.resolved[rule] if rule else None
+
+    def _resolve(self, record: DeprecatedCommand) -> Deprecation:
+        if record in self.resolved:
+            return self.resolved[record]
+
+        # 沿替代命令前进直到遇到未废弃命令、已移除、已解析的规则或环
+        path = [record]
+        chain: List[str] = []
+        on_path = {record}
+        tail: Optional[Deprecation] = None
+        cycle = False
+        rule = record
+        while rule.new_cmd:
+            chain.append(rule.new_cmd)
+            rule = self.rule_for(rule.new_cmd)
+            if rule is None:
+                break
+            if rule in self.resolved:
+                tail = self.resolved[rule]
+                break
+            if rule in on_path:
+                cycle = True
+                break
+            path.append(rule)
+            on_path.add(rule)
+
+        # 只有从环的入口规则开始的后缀才真正在环上，之前的规则只是通向环
+        on_cycle = set(path[path.index(rule):]) if cycle else set()
+        if tail is not None:
+            terminal, rest = tail.terminal, tail.chain
+            into_cycle = tail.cycle or tail.into_cycle
+        elif cycle or not chain or rule is not None:
+            terminal, rest, into_cycle = None, (), cycle
+        else:
+            terminal, rest, into_cycle = chain[-1], (), False
+
+        # 回填路径上每条规则：各自的链条是整条链的后缀
+        for i, r in enumerate(path):
+            self.resolved[r] = Deprecation(r, tuple(chain[i:]) + rest, terminal,
+                                           r in on_cycle, into_cycle and r not in on_cycle)
+        return self.resolved[record]
+
+    def cycles(self) -> List[Deprecation]:
+        """位于替代链环上的规则"""
+        return [d for d in self.resolved.values() if d.cycle]
+
+    def into_cycles(self) -> List[Deprecation]:
+        """自身不在环上、但替代链通向环的规则"""
+        return [d for d in self.resolved.values() if d.into_cycle]
+
+# ============================================
+# 分析与报告
+# ============================================
+
+def get_command_source(cmd: str, index: Dict[str, CommandEntry]) -> str:
+    """获取命令的来源目录"""
+    entry = index.get(cmd)
+    return entry.source if entry else 'unknown'
 
-    return pattern_commands
+def analyze_commands(cache: Optional[ScanCache] = None,
+                     walk: Optional[Dict[str, List[CommandEntry]]] = None) -> Dict:
+    """分析命令差异
 
-def get_command_source(cmd: str, claude_cmds: Set[str], claude_skls: Set[str],
-                       codex_prmts: Set[str], codex_skls: Set[str]) -> str:
-    """获取命令的来源目录"""
-    if cmd in claude_cmds:
-        return 'claude/commands'
-    elif cmd in claude_skls:
-        return 'claude/skills'
-    elif cmd in codex_prmts:
-        return 'codex/prompts'
-    elif cmd in codex_skls:
-        return 'codex/skills'
-    return 'unknown'
-
-def analyze_commands() -> Dict:
-    """分析命令差异"""
-    # 获取各来源的命令
-    claude_commands = get_claude_commands()
-    claude_skills = get_claude_skills()
-    codex_prompts = get_codex_prompts()
-    codex_skills = get_codex_skills()
-
-    # 合并所有实际存在的命令
-    all_actual = claude_commands | claude_skills | codex_prompts | codex_skills
-
-    # 获取 commands.ts 中定义的命令
-    ts_commands = get_ts_commands()
-
-    # 获取废弃命令
-    deprecated = get_deprecated_commands()
-
-    # 获取命令链中引用的命令
-    pattern_commands = get_pattern_commands()
-
-    # 计算差异
-    missing = all_actual - ts_commands  # 目录存在但 ts 缺失
-    extra = ts_commands - all_actual     # ts 存在但目录不存在
-
-    # 检测残留旧命令（目录中存在但已被废弃）
-    stale_in_dirs = set()
-    for cmd in all_actual:
-        if cmd in deprecated:
-            stale_in_dirs.add(cmd)
-
-    # 检测 patterns.ts 中引用但实际不存在的命令
-    pattern_orphans = pattern_commands - all_actual - ts_commands
+    Args:
+        cache: 扫描缓存，未变化的目录和数据文件直接复用上次结果
+        walk: 已有的 walk_all 遍历结果（同时生成命令清单时复用，不再遍历一遍）
+    """
+    with _span('analyze'):
+        # 并发扫描各来源目录
+        scans = sync_view(walk) if walk is not None else scan_all(cache)
+
+        # 解析数据文件
+        with _span('ts_extract'):
+            ts_records = load_ts_commands(cache)
+            deprecated_records = load_deprecated_commands(cache)
+            pattern_steps = load_pattern_steps(cache)
+
+        return compute_sync_diff(scans, ts_records, deprecated_records, pattern_steps)
+
+def compute_sync_diff(scans: Dict[str, List[CommandEntry]], ts_records: List[Command],
+                      deprecated_records: List[DeprecatedCommand],
+                      pattern_steps: List[PatternStep]) -> Dict:
+    """由目录扫描结果和数据文件记录计算同步差异（纯内存计算，不访问文件系统）"""
+    with _span('diff'):
+        claude_commands = {e.name for e in scans['claude/commands']}
+        claude_skills = {e.name for e in scans['claude/skills']}
+        codex_prompts = {e.name for e in scans['codex/prompts']}
+        codex_skills = {e.name for e in scans['codex/skills']}
+
+        # 合并所有实际存在的命令（命令名 -> 优先来源记录）
+        index = build_command_index(scans)
+        all_actual = set(index)
+
+        # commands.ts 中定义的命令
+        ts_commands = {c.cmd for c in ts_records}
+
+        # 废弃命令
+        deprecated = {d.old: d.new_cmd or 'removed' for d in deprecated_records}
+        deprecations = DeprecationIndex(deprecated_records)
+
+        # 命令链中引用的命令
+        pattern_commands = {step.cmd for step in pattern_steps}
+
+        # 每个命令在数据文件中首次出现的行号，供报告定位
+        ts_lines: Dict[str, int] = {}
+        for c in ts_records:
+            ts_lines.setdefault(c.cmd, c.line)
+        pattern_lines: Dict[str, int] = {}
+        for step in pattern_steps:
+            pattern_lines.setdefault(step.cmd, step.line)
+
+        # 计算差异
+        missing = all_actual - ts_commands  # 目录存在但 ts 缺失
+        extra = ts_commands - all_actual     # ts 存在但目录不存在
+
+        # 检测残留旧命令（目录中存在但已被废弃）
+        stale_in_dirs = {cmd for cmd in all_actual if deprecations.lookup(cmd)}
+
+        # 检测 patterns.ts 中引用但实际不存在的命令
+        pattern_orphans = pattern_commands - all_actual - ts_commands
+
+        return {
+            'total_actual': len(all_actual),
+            'total_ts': len(ts_commands),
+            'total_deprecated': len(deprecated),
+            'claude_commands': claude_commands,
+            'claude_skills': claude_skills,
+            'codex_prompts': codex_prompts,
+            'codex_skills': codex_skills,
+            'scans': scans,
+            'index': index,
+            'missing': missing,
+            'extra': extra,
+            'all_actual': all_actual,
+            'ts_commands': ts_commands,
+            'ts_records': ts_records,
+            'pattern_steps': pattern_steps,
+            'deprecated': deprecated,
+            'deprecations': deprecations,
+            'ts_lines': ts_lines,
+            'pattern_lines': pattern_lines,
+            'stale_in_dirs': stale_in_dirs,
+            'pattern_commands': pattern_commands,
+            'pattern_orphans': pattern_orphans,
+        }
 
+def describe_deprecation(deprecation: Deprecation) -> str:
+    """废弃命令的处理建议：最终替代命令（经过多级替代时附带完整链条）"""
+    if deprecation.cycle:
+        return f"[替代链成环: {' -> '.join(deprecation.chain)}]"
+    if deprecation.into_cycle:
+        return f"[替代链通向环: {' -> '.join(deprecation.chain)}]"
+    if deprecation.terminal is None:
+        return "[已移除]"
+    if len(deprecation.chain) > 1:
+        return f"-> 使用 {deprecation.terminal} (经 {' -> '.join(deprecation.chain[:-1])})"
+    return f"-> 使用 {deprecation.terminal}"
+
+def summarize_result(result: Dict) -> Dict[str, Any]:
+    """分析结果的 JSON 摘要（--json 输出与批量报告共用）"""
     return {
-        'total_actual': len(all_actual),
-        'total_ts': len(ts_commands),
-        'total_deprecated': len(deprecated),
-        'claude_commands': claude_commands,
-        'claude_skills': claude_skills,
-        'codex_prompts': codex_prompts,
-        'codex_skills': codex_skills,
-        'missing': missing,
-        'extra': extra,
-        'all_actual': all_actual,
-        'ts_commands': ts_commands,
-        'deprecated': deprecated,
-        'stale_in_dirs': stale_in_dirs,
-        'pattern_commands': pattern_commands,
-        'pattern_orphans': pattern_orphans,
+        'total_actual': result['total_actual'],
+        'total_ts': result['total_ts'],
+        'total_deprecated': result['total_deprecated'],
+        'missing': sorted(list(result['missing'])),
+        'extra': sorted(list(result['extra'])),
+        'stale_in_dirs': sorted(list(result['stale_in_dirs'])),
+        'pattern_orphans': sorted(list(result['pattern_orphans'])),
+        'synced': not result['missing'] and not result['extra'] and not result['stale_in_dirs'],
     }
 
 def print_report(result: Dict):
@@ -243,13 +1333,7 @@ def print_report(result: Dict):
     if result['missing']:
         print(f"\n[目录存在但 commands.ts 缺失] ({len(result['missing'])}):")
         for cmd in sorted(result['missing']):
-            source = get_command_source(
-                cmd,
-                result['claude_commands'],
-                result['claude_skills'],
-                result['codex_prompts'],
-                result['codex_skills']
-            )
+            source = get_command_source(cmd, result['index'])
             print(f"  {cmd:40} [{source}]")
     else:
         print("\n[目录存在但 commands.ts 缺失]: 无")
@@ -258,7 +1342,7 @@ def print_report(result: Dict):
     if result['extra']:
         print(f"\n[commands.ts 存在但目录不存在 - 应移入废弃列表] ({len(result['extra'])}):")
         for cmd in sorted(result['extra']):
-            print(f"  {cmd}")
+            print(f"  {cmd:40} src/data/commands.ts:{result['ts_lines'][cmd]}")
     else:
         print("\n[commands.ts 存在但目录不存在]: 无")
 
@@ -266,19 +1350,24 @@ def print_report(result: Dict):
     if result['stale_in_dirs']:
         print(f"\n[残留旧命令 - 目录存在但已被废弃，应删除] ({len(result['stale_in_dirs'])}):")
         for cmd in sorted(result['stale_in_dirs']):
-            replacement = result['deprecated'].get(cmd, 'removed')
-            if replacement != 'removed':
-                print(f"  {cmd:40} -> 使用 {replacement}")
-            else:
-                print(f"  {cmd:40} [已移除]")
+            print(f"  {cmd:40} {describe_deprecation(result['deprecations'].lookup(cmd))}")
     else:
         print("\n[残留旧命令]: 无")
 
+    # 替代链成环
+    cycles = result['deprecations'].cycles()
+    if cycles:
+        print(f"\n[deprecated.ts 替代链成环] ({len(cycles)}):")
+        for d in sorted(cycles, key=lambda d: d.rule.line):
+            print(f"  {d.rule.old:40} src/data/deprecated.ts:{d.rule.line} -> {' -> '.join(d.chain)}")
+        for d in sorted(result['deprecations'].into_cycles(), key=lambda d: d.rule.line):
+            print(f"  {d.rule.old:40} src/data/deprecated.ts:{d.rule.line} -> {' -> '.join(d.chain)} (通向环)")
+
     # patterns.ts 中的孤立引用
     if result['pattern_orphans']:
         print(f"\n[patterns.ts 引用但实际不存在的命令] ({len(result['pattern_orphans'])}):")
         for cmd in sorted(result['pattern_orphans']):
-            print(f"  {cmd}")
+            print(f"  {cmd:40} src/data/patterns.ts:{result['pattern_lines'][cmd]}")
     else:
         print("\n[patterns.ts 孤立引用]: 无")
 
@@ -305,13 +1394,7 @@ def generate_fix_suggestions(result: Dict) -> str:
     if result['missing']:
         suggestions.append("\n## 需要添加到 commands.ts 的命令:\n")
         for cmd in sorted(result['missing']):
-            source = get_command_source(
-                cmd,
-                result['claude_commands'],
-                result['claude_skills'],
-                result['codex_prompts'],
-                result['codex_skills']
-            )
+            source = get_command_source(cmd, result['index'])
             cli = 'claude' if 'claude' in source else 'codex'
             category = 'skill' if 'skill' in source else ('prompt' if 'prompt' in source else 'workflow')
             suggestions.append(f"  {cmd:40} [{source}]")
@@ -329,37 +1412,1601 @@ def generate_fix_suggestions(result: Dict) -> str:
                 suggestions.append(f"# {cmd} -> rm -rf .claude/commands/{base}/{sub}.md 或 .claude/skills/{base}")
             else:
                 suggestions.append(f"# {cmd} -> rm -rf .claude/commands/{cmd[1:]}.md 或 .claude/skills/{cmd[1:]}")
+            suggestions.append(f"#   {describe_deprecation(result['deprecations'].lookup(cmd))}")
+        suggestions.append("```\n")
+
+    # 替代命令本身又被废弃：直接指向最终替代命令
+    deprecations = result['deprecations']
+    shortcuts = sorted((d for d in deprecations.resolved.values()
+                        if len(d.chain) > 1 and not d.cycle and not d.into_cycle), key=lambda d: d.rule.line)
+    if shortcuts:
+        suggestions.append("\n## deprecated.ts 中可直接指向最终替代命令的条目:\n")
+        suggestions.append("```typescript")
+        for d in shortcuts:
+            new_cmd = f"'{d.terminal}'" if d.terminal else 'null'
+            suggestions.append(f"  // 第 {d.rule.line} 行: {' -> '.join(d.chain)}")
+            suggestions.append(f"  {{ old: '{d.rule.old}', newCmd: {new_cmd}, ... }},")
         suggestions.append("```\n")
 
+    cycles = deprecations.cycles()
+    if cycles:
+        suggestions.append("\n## deprecated.ts 中成环的替代链（需人工确认最终替代命令）:\n")
+        for d in sorted(cycles, key=lambda d: d.rule.line):
+            suggestions.append(f"  {d.rule.old:40} 第 {d.rule.line} 行: {' -> '.join(d.chain)}")
+        leading = deprecations.into_cycles()
+        if leading:
+            suggestions.append("\n  以下条目本身不在环上，通向上述环，修正环后即可解析:")
+            for d in sorted(leading, key=lambda d: d.rule.line):
+                suggestions.append(f"  {d.rule.old:40} 第 {d.rule.line} 行: {' -> '.join(d.chain)}")
+
     return '\n'.join(suggestions)
 
+# ============================================
+# 命令清单生成（public/commands-scanned.json）
+# ============================================
+
+def _parse_frontmatter(lines: List[str]) -> Dict[str, str]:
+    """解析 frontmatter 键值（与 scan-commands.js 一致：首个冒号分隔，去掉首尾各一个双引号）"""
+    frontmatter = {}
+    for line in lines[1:]:
+        if line.strip() == '---':
+            break
+        if ':' in line:
+            key, _, value = line.partition(':')
+            value = value.strip()
+            value = value[1:] if value.startswith('"') else value
+            value = value[:-1] if value.endswith('"') else value
+            frontmatter[key.strip()] = value
+    return frontmatter
+
+def parse_markdown_head(text: str, eof: bool = True) -> Optional[Tuple[Dict[str, str], str]]:
+    """从 Markdown 开头解析 frontmatter 与 H1 后的首段描述
+
+    Args:
+        text: 文件开头的若干完整行
+        eof: text 是否已包含文件全部内容
+
+    Returns:
+        (frontmatter, h1_description)；text 不足以确定结果时返回 None
+    """
+    lines = text.split('\n')
+    frontmatter: Dict[str, str] = {}
+    body = text
+    if text.startswith('---'):
+        if not eof and not any(line.strip() == '---' for line in lines[1:]):
+            return None
+        frontmatter = _parse_frontmatter(lines)
+        end = text.find('---', 3)
+        if end != -1:
+            body = text[end + 3:].strip()
+
+    found_h1 = False
+    parts: List[str] = []
+    for line in body.split('\n'):
+        stripped = line.strip()
+        if not found_h1:
+            if stripped.startswith('# ') and len(stripped) > 2:
+                found_h1 = True
+            continue
+        # 遇到下一个标题、分隔线、代码块或内容后的空行即结束
+        if stripped.startswith(('#', '---', '```')):
+            break
+        if not stripped:
+            if parts:
+                break
+            continue
+        parts.append(stripped)
+    else:
+        if not eof:
+            return None
+
+    return frontmatter, ' '.join(parts).strip()
+
+def read_markdown_head(path: str) -> Optional[Tuple[Dict[str, str], str]]:
+    """只读取文件开头足以解析 frontmatter 与 H1 描述的部分，文件不存在时返回 None"""
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+
+    with f:
+        data = b''
+        size = HEAD_READ_BYTES
+        while True:
+            chunk = f.read(size - len(data))
+            data += chunk
+            eof = len(data) < size
+            # 未到文件末尾时只解析完整的行（\n 不会出现在 UTF-8 多字节字符内部）
+            complete = data if eof else data[:data.rfind(b'\n') + 1]
+            parsed = parse_markdown_head(complete.decode('utf-8', errors='replace'), eof)
+            if parsed is not None:
+                _count('bytes_read', len(data))
+                return parsed
+            size *= 2
+
+def _determine_usage_scenario(name: str, description: str) -> str:
+    text = name.lower() + ' ' + (description or '').lower()
+    for pattern, scenario in (
+        (r'plan|design|breakdown|brainstorm|roadmap', 'planning'),
+        (r'implement|execute|generate|create|write|build', 'implementation'),
+        (r'test|tdd|verify|coverage', 'testing'),
+        (r'docs|documentation|memory|compact', 'documentation'),
+        (r'session|resume|status|complete', 'session-management'),
+        (r'analyze|review|diagnosis|discover', 'analysis'),
+        (r'debug|fix|troubleshoot', 'debugging'),
+        (r'issue|bug|problem', 'issue-management'),
+    ):
+        if re.search(pattern, text):
+            return scenario
+    return 'general'
+
+def _determine_difficulty(name: str, description: str) -> str:
+    text = name.lower() + ' ' + (description or '').lower()
+    if any(k in text for k in ('status', 'list', 'chat', 'analyze', 'version', 'simple', 'basic')):
+        return 'Beginner'
+    if any(k in text for k in ('tdd', 'conflict', 'agent', 'auto-parallel', 'coverage', 'synthesis', 'complex')):
+        return 'Advanced'
+    return 'Intermediate'
+
+def _build_command_name(name: str, category: str, subcategory: Optional[str]) -> str:
+    """由 frontmatter 名称与目录层级拼出命令名，如 /workflow:ui-design:explore"""
+    if ':' in name or category == 'general':
+        return '/' + name
+    if subcategory and subcategory != '_root':
+        sub = subcategory
+        if sub.startswith(category + '/'):
+            sub = sub[len(category) + 1:]
+        sub = sub.replace('/', ':')
+        if sub:
+            return f'/{category}:{sub}:{name}'
+    return f'/{category}:{name}'
+
+def _scanned_source(entry: CommandEntry) -> str:
+    """扫描记录对应的 Markdown 文件（相对 ROOT_DIR），即清单中的 source 字段"""
+    if entry.kind == 'file':
+        return f'.{entry.source}/{entry.rel_path}'
+    return f'.{entry.source}/{entry.rel_path}/SKILL.md'
+
+def _describe_entry(entry: CommandEntry) -> Optional[Dict[str, Any]]:
+    """读取一条扫描记录对应的 Markdown 头部，生成清单中的命令描述（不符合条件时返回 None）"""
+    source = _scanned_source(entry)
+    head = read_markdown_head(str(ROOT_DIR / source))
+    if head is None:
+        return None
+    frontmatter, h1_description = head
+
+    subcategory = None
+    if entry.source == 'claude/commands':
+        name = frontmatter.get('name')
+        if not name:
+            return None
+        dirs = entry.rel_path.split('/')[:-1]
+        category = dirs[0].lower() if dirs else 'general'
+        subcategory = '/'.join(dirs) or None
+        if subcategory == category:
+            subcategory = None
+        command = _build_command_name(name, category, subcategory)
+    elif entry.source == 'claude/skills':
+        name = frontmatter.get('name')
+        if not name:
+            return None
+        category, command = 'skill', '/' + name
+    elif entry.source == 'codex/prompts':
+        name = entry.rel_path[:-3]
+        category, command = 'prompt', '/codex:' + name
+    else:
+        name = frontmatter.get('name') or entry.rel_path
+        category, subcategory, command = 'skill', 'codex', '/' + name
+
+    description = frontmatter.get('description', '')
+    return {
+        'name': name,
+        'command': command,
+        'description': description,
+        'h1_description': h1_description,
+        'arguments': frontmatter.get('argument-hint') or frontmatter.get('arguments') or '',
+        'category': category,
+        'subcategory': subcategory,
+        'usage_scenario': _determine_usage_scenario(name, description),
+        'difficulty': _determine_difficulty(name, description),
+        'cli': entry.source.split('/')[0],
+        'source': source,
+        'allowed_tools': frontmatter.get('allowed-tools') or '',
+    }
+
+# 近似 JS localeCompare 的排序：标点 < 数字 < 字母，先忽略重音与大小写比较
+_COLLATION_PUNCT = str.maketrans({c: chr(i + 1) for i, c in enumerate('_-,;:!?.\'"()[]{}@*/\\&#%`^+<=>|~$')})
+
+def _collation_key(name: str) -> Tuple[str, str, str]:
+    lower = name.lower()
+    base = ''.join(c for c in unicodedata.normalize('NFD', lower) if not unicodedata.combining(c))
+    # 次键区分重音，末键小写在前
+    return base.translate(_COLLATION_PUNCT), lower, name.swapcase()
+
+def _build_relationships(commands: List[Dict[str, Any]]) -> Dict[str, Dict[str, List[str]]]:
+    """从描述文字中推断命令的前置/后续关系"""
+    relationships = {}
+    for cmd in commands:
+        desc = cmd['description'].lower()
+        rel = {'prerequisites': [], 'next_steps': [], 'alternatives': [], 'related': []}
+        mentioned = [m for m in re.findall(r'/[a-z\-:]+', desc) if m != cmd['command']]
+        if 'prerequisite' in desc or 'requires' in desc:
+            rel['prerequisites'] = mentioned
+        if 'next' in desc or 'followed by' in desc or 'then' in desc:
+            rel['next_steps'] = mentioned
+        if any(rel.values()):
+            relationships[cmd['name']] = rel
+    return relationships
+
+def build_scanned_commands(walk: Dict[str, List[CommandEntry]]) -> Dict[str, Any]:
+    """由 walk_all 的遍历结果筛选清单收录的记录，并发读取各命令文件头部，生成 commands-scanned.json 的内容"""
+    with _span('scanned') as parent:
+        def describe(entry: CommandEntry) -> Optional[Dict[str, Any]]:
+            with _span('scanned:read', parent):
+                return _describe_entry(entry)
+
+        ordered = [(rank, entry) for rank, (source, _, _) in enumerate(SCAN_ROOTS)
+                   for entry in walk.get(source, ()) if entry.listed]
+        with ThreadPoolExecutor() as pool:
+            described = list(pool.map(describe, (entry for _, entry in ordered)))
+
+        counts = {source: 0 for source, _, _ in SCAN_ROOTS}
+        rows = []
+        for (rank, entry), command in zip(ordered, described):
+            if command is not None:
+                counts[entry.source] += 1
+                rows.append((_collation_key(command['name']), rank, entry.rel_path, command))
+        rows.sort(key=lambda row: row[:3])
+        commands = [row[3] for row in rows]
+
+        # 与 JS Date.toISOString() 格式一致
+        now = time.time()
+        generated = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now)) + f'.{int(now * 1000) % 1000:03d}Z'
+        return {
+            '_metadata': {
+                'version': SCANNED_VERSION,
+                'generated': generated,
+                'total_commands': len(commands),
+                'sources': {
+                    'claude_commands': counts['claude/commands'],
+                    'claude_skills': counts['claude/skills'],
+                    'codex_prompts': counts['codex/prompts'],
+                    'codex_skills': counts['codex/skills'],
+                },
+            },
+            'commands': commands,
+            'categories': sorted({c['category'] for c in commands}),
+            'clis': ['claude', 'codex'],
+            'relationships': _build_relationships(commands),
+        }
+
+def write_scanned_commands(scanned: Dict[str, Any], path: Path):
+    """写出命令清单（先写临时文件再替换，前端开发服务器不会读到半截文件）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(scanned, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def emit_scanned_commands(path: Path, walk: Dict[str, List[CommandEntry]],
+                          cache: Optional[ScanCache] = None) -> Dict[str, Any]:
+    """由遍历结果生成并写出命令清单，返回清单内容
+
+    清单读取的每个 Markdown 文件（含尚不存在的 SKILL.md）都会登记到 cache.watched，
+    监视模式下仅修改文件内容也能触发重新生成。
+    """
+    scanned = build_scanned_commands(walk)
+    write_scanned_commands(scanned, path)
+    if cache is not None:
+        cache.watched.update(str(ROOT_DIR / _scanned_source(entry))
+                             for entries in walk.values() for entry in entries if entry.listed)
+    return scanned
+
+# ============================================
+# 交叉引用校验
+# ============================================
+
+class CommandMatcher:
+    """Aho-Corasick 多模式匹配器：所有模式编译为一个自动机，一次线性扫描找出全部出现位置"""
+
+    def __init__(self, patterns: Set[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[Tuple[str, ...]] = [()]
+
+        for pattern in patterns:
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                state = nxt
+            self.out[state] = (pattern,)
+
+        # 按 BFS 顺序构建失败链接，输出集合沿失败链接合并
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                if state:
+                    f = self.fail[state]
+                    while f and ch not in self.goto[f]:
+                        f = self.fail[f]
+                    self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] += self.out[self.fail[nxt]]
+
+        # 根状态只接受模式首字符，其余字符可整段跳过
+        self.first_chars = ''.join(self.goto[0])
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """依次产出 (起始偏移, 模式)"""
+        goto, fail, out = self.goto, self.fail, self.out
+        skip = len(self.first_chars) == 1
+        state = 0
+        i, n = 0, len(text)
+        while i < n:
+            if state == 0 and skip:
+                i = text.find(self.first_chars, i)
+                if i < 0:
+                    return
+            ch = text[i]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern in out[state]:
+                yield i - len(pattern) + 1, pattern
+            i += 1
+
+class CommandRef(NamedTuple):
+    """文档或数据文件中一处有问题的命令引用"""
+    cmd: str
+    file: str                   # 相对 ROOT_DIR 的路径（/ 分隔）
+    line: int
+    col: int
+    kind: str                   # 'deprecated'、'declared'（只在 commands.ts 中声明、没有命令文件）或 'dangling'
+    replacement: Optional[str]  # 废弃命令的最终替代命令，其余情况为 None
+
+# 命令名由这些字符组成；引用前一个字符属于该集合（或 . /）、或其后紧跟 / 或扩展名时
+# 视为路径等其他文本的一部分（如 <dir>/spec-config.json）
+_REF_TOKEN_RE = re.compile(r'/[A-Za-z0-9_:\-]*')
+_REF_WORD_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_:-./')
+_REF_PATH_TAIL_RE = re.compile(r'/|\.\w')
+
+# 这两个文件分别定义命令与废弃列表，不作为引用方校验
+REF_SKIP_DATA_FILES = {'commands.ts', 'deprecated.ts'}
+
+def iter_reference_files() -> Iterator[str]:
+    """列出需要校验的文件：src/data 下的数据文件和 .claude/.codex 下全部 Markdown"""
+    try:
+        names = sorted(os.listdir(DATA_DIR))
+    except OSError:
+        names = []
+    for name in names:
+        if name.endswith('.ts') and name not in REF_SKIP_DATA_FILES:
+            yield str(DATA_DIR / name)
+
+    for top in ('.claude', '.codex'):
+        for dirpath, dirnames, filenames in os.walk(ROOT_DIR / top):
+            dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDED_SKILLS)
+            for name in sorted(filenames):
+                if name.endswith('.md'):
+                    yield os.path.join(dirpath, name)
+
+def command_prefixes(commands: Set[str]) -> Set[str]:
+    """命令名的命名空间前缀：每个 : 或 - 及其之前的部分，如 /workflow:、/team-"""
+    return {cmd[:i + 1] for cmd in commands for i, ch in enumerate(cmd) if ch in ':-'}
+
+def find_command_refs(text: str, matcher: CommandMatcher, live: Set[str], declared: Set[str], known: Set[str],
+                      deprecations: DeprecationIndex) -> Iterator[Tuple[int, str, str, Optional[str]]]:
+    """在一段文本中查找指向废弃或不存在命令的引用
+
+    matcher 同时包含完整命令名和 command_prefixes 得到的前缀：完整命令名需与引用完全一致，
+    前缀命中时若整个引用不是任何已知命令，则报告为悬空引用。不含 : 或 - 的命令名没有前缀，
+    指向这类不存在命令的引用无法与普通文本区分，不会报告。
+
+    Args:
+        live: 有命令文件的命令
+        declared: commands.ts 中声明的命令，不在 live 中时单独报告
+        known: 全部已知命令（含废弃命令和 patterns.ts 引用的命令）
+
+    Returns:
+        逐个产出 (偏移, 命令名, 'deprecated' | 'declared' | 'dangling', 替代命令)
+    """
+    reported = set()
+    for start, pattern in matcher.iter_matches(text):
+        if start in reported or (start and text[start - 1] in _REF_WORD_CHARS):
+            continue
+        match = _REF_TOKEN_RE.match(text, start)
+        if _REF_PATH_TAIL_RE.match(text, match.end()):
+            continue
+        token = match.group().rstrip(':-')
+        if pattern in known:
+            if token != pattern:
+                continue
+        elif len(token) < len(pattern) or token in known:
+            # 命名空间本身或已知命令（由完整命令名模式处理）
+            continue
+
+        deprecation = deprecations.lookup(token)
+        if deprecation:
+            reported.add(start)
+            yield start, token, 'deprecated', deprecation.terminal
+        elif token not in live:
+            reported.add(start)
+            yield start, token, 'declared' if token in declared else 'dangling', None
+
+def check_references(result: Dict, files: Optional[List[str]] = None) -> List[CommandRef]:
+    """校验数据文件与 Markdown 文档中的命令引用
+
+    Args:
+        result: analyze_commands 的分析结果
+        files: 要校验的文件，默认 iter_reference_files()
+    """
+    with _span('refs') as parent:
+        live = result['all_actual']
+        deprecations = result['deprecations']
+        declared = result['ts_commands']
+        known = live | declared | result['pattern_commands'] | set(result['deprecated'])
+        with _span('refs:compile', parent):
+            matcher = CommandMatcher(known | command_prefixes(known))
+
+        def check(path: str) -> List[CommandRef]:
+            with _span('refs:file', parent):
+                try:
+                    with open(path, 'rb') as f:
+                        raw = f.read()
+                except OSError:
+                    return []
+                _count('bytes_read', len(raw))
+                text = raw.decode('utf-8', errors='replace')
+                rel = Path(path).relative_to(ROOT_DIR).as_posix()
+                lines = _LineCounter(text)
+                return [CommandRef(cmd, rel, *lines.position(offset), kind, replacement)
+                        for offset, cmd, kind, replacement
+                        in find_command_refs(text, matcher, live, declared, known, deprecations)]
+
+        with ThreadPoolExecutor() as pool:
+            found = pool.map(check, list(files) if files is not None else list(iter_reference_files()))
+            return [ref for refs in found for ref in refs]
+
+def print_reference_report(refs: List[CommandRef]):
+    """打印交叉引用校验结果"""
+    deprecated = [r for r in refs if r.kind == 'deprecated']
+    declared = [r for r in refs if r.kind == 'declared']
+    dangling = [r for r in refs if r.kind == 'dangling']
+
+    if deprecated:
+        print(f"\n[引用了已废弃的命令] ({len(deprecated)}):")
+        for r in deprecated:
+            hint = f"-> 使用 {r.replacement}" if r.replacement else "[已移除]"
+            print(f"  {r.cmd:40} {r.file}:{r.line}:{r.col} {hint}")
+    else:
+        print("\n[引用了已废弃的命令]: 无")
+
+    if declared:
+        print(f"\n[引用了只在 commands.ts 中声明、没有命令文件的命令] ({len(declared)}):")
+        for r in declared:
+            print(f"  {r.cmd:40} {r.file}:{r.line}:{r.col}")
+    else:
+        print("\n[引用了只在 commands.ts 中声明、没有命令文件的命令]: 无")
+
+    if dangling:
+        print(f"\n[引用了不存在的命令] ({len(dangling)}):")
+        for r in dangling:
+            print(f"  {r.cmd:40} {r.file}:{r.line}:{r.col}")
+    else:
+        print("\n[引用了不存在的命令]: 无")
+
+# ============================================
+# 技能内容相似度（.claude 与 .codex）
+# ============================================
+
+# MinHash 签名长度与 LSH 分带：16 带 x 4 行，相似度约 0.5 以上的技能对大概率成为候选
+MINHASH_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERM // LSH_BANDS
+# 相似度不低于该值视为近似重复
+NEAR_DUP_THRESHOLD = 0.8
+
+# 空桶的签名值，大于任何分块哈希
+_MINHASH_EMPTY = 1 << 64
+
+class SkillFingerprint(NamedTuple):
+    """一个技能目录的内容指纹"""
+    name: str
+    source: str                # claude/skills 或 codex/skills
+    files: int                 # Markdown 文件数
+    digest: str                # 全部文件内容哈希的组合，相同即内容完全一致
+    signature: Tuple[int, ...]  # 所有文件分块集合并集的 MinHash 签名
+
+class SkillPair(NamedTuple):
+    """一对 .claude / .codex 技能的对比结果"""
+    claude: str
+    codex: str
+    kind: str          # identical / near_duplicate / diverged
+    similarity: float  # 估计的 Jaccard 相似度
+
+def minhash_text(content: str) -> List[int]:
+    """计算文本的 MinHash 签名
+
+    按行分块（去除首尾空白、合并连续空白、忽略空行），每块只算一次 64 位哈希：
+    低 6 位决定落入哪个桶，其余位参与桶内取最小（one permutation hashing），
+    避免对每块计算 MINHASH_PERM 次哈希。签名逐位取最小即为并集的签名。
+    """
+    signature = [_MINHASH_EMPTY] * MINHASH_PERM
+    for line in content.split('\n'):
+        line = ' '.join(line.split())
+        if line:
+            h = int.from_bytes(hashlib.blake2b(line.encode('utf-8'), digest_size=8).digest(), 'little')
+            bucket = h % MINHASH_PERM
+            value = h // MINHASH_PERM
+            if value < signature[bucket]:
+                signature[bucket] = value
+    return signature
+
+def _skill_markdown_files(skill_dir: str) -> List[str]:
+    """技能目录下全部 Markdown 文件（含 phases/、roles/、templates/ 等子目录），按相对路径排序"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(skill_dir):
+        dirnames.sort()
+        files.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith('.md'))
+    return files
+
+def fingerprint_skills(scans: Dict[str, List[CommandEntry]], cache: Optional[ScanCache] = None) -> List[SkillFingerprint]:
+    """为两侧技能目录计算指纹；每个文件的签名按内容哈希缓存，重复运行只重新计算变化的文件"""
+    if cache is None:
+        cache = ScanCache(enabled=False)
+    codec = {'encode': lambda v: [v[0], v[1]], 'decode': lambda v: (v[0], v[1])}
+
+    def fingerprint_file(content: str) -> Tuple[str, List[int]]:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest(), minhash_text(content)
+
+    fingerprints = []
+    seen_keys = set()
+    with _span('skills:fingerprint'):
+        for source in ('claude/skills', 'codex/skills'):
+            for entry in scans.get(source, ()):
+                skill_dir = ROOT_DIR / ('.' + source) / entry.rel_path
+                digests = []
+                signature = [_MINHASH_EMPTY] * MINHASH_PERM
+                files = _skill_markdown_files(str(skill_dir))
+                for path in files:
+                    key = 'fp/' + Path(path).relative_to(ROOT_DIR).as_posix()
+                    seen_keys.add(key)
+                    # 技能目录中可能混有非 UTF-8 文件，指纹只用于相似度比较，按替换字符解码即可
+                    digest, file_signature = cache.cached_file_parse(key, Path(path), fingerprint_file,
+                                                                     errors='replace', **codec)
+                    digests.append(digest)
+                    # 并集的 MinHash 等于各文件签名逐位取最小
+                    signature = [min(x, y) for x, y in zip(signature, file_signature)]
+                combined = hashlib.sha256('\n'.join(sorted(digests)).encode('ascii')).hexdigest()
+                fingerprints.append(SkillFingerprint(entry.name, source, len(files), combined, tuple(signature)))
+
+    # 清理已删除文件的指纹
+    stale = [key for key in cache.entries if key.startswith('fp/') and key not in seen_keys]
+    for key in stale:
+        del cache.entries[key]
+    if stale:
+        cache.dirty = True
+    return fingerprints
+
+def _similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    # 两侧都为空的桶不携带信息，不计入
+    used = matched = 0
+    for x, y in zip(a, b):
+        if x != _MINHASH_EMPTY or y != _MINHASH_EMPTY:
+            used += 1
+            matched += x == y
+    return matched / used if used else 0.0
+
+def compare_skills(fingerprints: List[SkillFingerprint],
+                   threshold: float = NEAR_DUP_THRESHOLD) -> List[SkillPair]:
+    """查找 .claude 与 .codex 之间内容完全一致、近似重复和同名但已分化的技能对
+
+    候选对来自 LSH 分带（签名切成若干带，任一带完全相同的技能落入同一桶），
+    再加上同名技能对，无需两两比较全部技能。
+    """
+    with _span('skills:compare'):
+        claude = [f for f in fingerprints if f.source == 'claude/skills' and f.files]
+        codex = [f for f in fingerprints if f.source == 'codex/skills' and f.files]
+
+        buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        for i, f in enumerate(codex):
+            for band in range(LSH_BANDS):
+                key = (band, f.signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+                buckets.setdefault(key, []).append(i)
+
+        codex_by_name = {f.name: i for i, f in enumerate(codex)}
+        pairs = []
+        for f in claude:
+            candidates = set()
+            for band in range(LSH_BANDS):
+                candidates.update(buckets.get((band, f.signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]), ()))
+            same_name = codex_by_name.get(f.name)
+            if same_name is not None:
+                candidates.add(same_name)
+            _count('skill_candidates', len(candidates))
+
+            for i in sorted(candidates):
+                other = codex[i]
+                if f.digest == other.digest:
+                    pairs.append(SkillPair(f.name, other.name, 'identical', 1.0))
+                    continue
+                similarity = _similarity(f.signature, other.signature)
+                if similarity >= threshold:
+                    pairs.append(SkillPair(f.name, other.name, 'near_duplicate', similarity))
+                elif i == same_name:
+                    pairs.append(SkillPair(f.name, other.name, 'diverged', similarity))
+        return pairs
+
+def print_skill_report(pairs: List[SkillPair]):
+    """打印技能内容对比结果"""
+    titles = {
+        'identical': '.claude 与 .codex 中内容完全一致的技能',
+        'near_duplicate': f'.claude 与 .codex 中近似重复的技能（相似度 >= {NEAR_DUP_THRESHOLD:g}）',
+        'diverged': '.claude 与 .codex 中同名但内容已分化的技能',
+    }
+    for kind, title in titles.items():
+        group = sorted((p for p in pairs if p.kind == kind), key=lambda p: (-p.similarity, p.claude))
+        if not group:
+            print(f"\n[{title}]: 无")
+            continue
+        print(f"\n[{title}] ({len(group)}):")
+        for p in group:
+            names = p.claude if p.claude == p.codex else f"{p.claude} ~ {p.codex}"
+            print(f"  {names:50} {p.similarity:.2f}")
+
+# ============================================
+# Git 增量模式
+# ============================================
+
+# 影响同步结果的路径前缀（相对 ROOT_DIR）
+GIT_WATCH_PREFIXES = ('.claude/', '.codex/', 'src/data/')
+
+class GitError(RuntimeError):
+    """git 命令执行失败"""
+
+def _git(*args: str) -> str:
+    try:
+        proc = subprocess.run(['git', *args], cwd=ROOT_DIR, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise GitError('未找到 git 命令')
+    except subprocess.CalledProcessError as e:
+        raise GitError(e.stderr.decode('utf-8', errors='replace').strip() or f'git {args[0]} 失败')
+    return proc.stdout.decode('utf-8', errors='replace')
+
+def git_changed_paths(since: Optional[str] = None, staged: bool = False) -> Set[str]:
+    """列出相对 since（默认 HEAD）发生变化的路径，重命名的新旧路径都计入
+
+    Args:
+        since: 比较基准的提交，staged=False 时与工作区比较并包含未跟踪文件
+        staged: 只看暂存区（pre-commit 场景）
+    """
+    prefixes = [p.rstrip('/') for p in GIT_WATCH_PREFIXES]
+    args = ['diff', '--name-status', '-M', '-z', '--relative']
+    if staged:
+        args.append('--cached')
+    if since:
+        args.append(since)
+    fields = _git(*args, '--', *prefixes).split('\0')
+
+    paths = set()
+    i = 0
+    while i < len(fields) - 1:
+        status = fields[i]
+        # 重命名/复制（R100、C75 等）后跟旧路径和新路径
+        count = 2 if status[:1] in ('R', 'C') else 1
+        paths.update(fields[i + 1:i + 1 + count])
+        i += 1 + count
+
+    if not staged:
+        untracked = _git('ls-files', '--others', '--exclude-standard', '-z', '--', *prefixes)
+        paths.update(p for p in untracked.split('\0') if p)
+    return {p for p in paths if p.startswith(GIT_WATCH_PREFIXES)}
+
+def _entry_for_path(path: str) -> Optional[CommandEntry]:
+    """变更路径 -> 它所影响的命令记录（与各来源的扫描规则一致），不影响任何命令时返回 None"""
+    parts = path.split('/')
+    top = '/'.join(parts[:2])
+    rest = parts[2:]
+    if top == '.claude/commands':
+        if rest and rest[-1].endswith('.md') and 'agent' not in rest[:-1]:
+            rel_path = '/'.join(rest)
+            return CommandEntry('/' + rel_path[:-3].replace('/', ':'), 'claude/commands', rel_path, 'file')
+    elif top in ('.claude/skills', '.codex/skills'):
+        if len(rest) >= 2 and not rest[0].startswith('_') \
+                and not (top == '.claude/skills' and rest[0] in EXCLUDED_SKILLS):
+            return CommandEntry('/' + rest[0], top[1:], rest[0], 'dir')
+    elif top == '.codex/prompts':
+        if len(rest) == 1 and rest[0].endswith('.md'):
+            return CommandEntry('/' + rest[0][:-3], 'codex/prompts', rest[0], 'file')
+    return None
+
+def _entries_present(entries: Set[CommandEntry]) -> Set[CommandEntry]:
+    """筛选出工作区中仍然存在的命令记录"""
+    return {e for e in entries
+            if (os.path.isdir if e.kind == 'dir' else os.path.isfile)(ROOT_DIR / _entry_path(e))}
+
+def index_entries() -> Dict[str, List[CommandEntry]]:
+    """由暂存区列出各来源的命令记录（只含参与同步检查的记录），结构与 scan_all 一致
+
+    技能目录以暂存区中含有文件为准；以符号链接形式提交的技能目录与目录扫描一样跟随链接，
+    按工作区中链接目标是否为目录判断。
+    """
+    scans: Dict[str, Set[CommandEntry]] = {source: set() for source, _, _ in SCAN_ROOTS}
+    for record in _git('ls-files', '--cached', '-s', '-z', '--', '.claude', '.codex').split('\0'):
+        if not record:
+            continue
+        mode, path = record.split(' ', 1)[0], record.split('\t', 1)[1]
+        entry = _entry_for_path(path)
+        if entry is None and mode == '120000':
+            # 符号链接：相当于技能目录中的一个文件
+            entry = _entry_for_path(path + '/')
+            if entry is not None and not os.path.isdir(ROOT_DIR / path):
+                entry = None
+        if entry is not None:
+            scans[entry.source].add(entry)
+    return {source: sorted(entries) for source, entries in scans.items()}
+
+def _load_git_records(name: str, parse: Callable[[str], Any], record_type: type,
+                      cache: ScanCache, revision: str, key: str) -> Any:
+    """读取 git 中某个版本的数据文件记录，按内容哈希缓存解析结果
+
+    Args:
+        revision: 提交（如 HEAD、main），空字符串表示暂存区
+        key: 缓存键
+    """
+    # 路径均相对 ROOT_DIR（可能是更大仓库中的子目录），与 diff --relative、ls-files 一致
+    path = f'src/data/{name}'
+    spec = f'{revision}:./{path}'
+    if revision:
+        listed = _git('ls-tree', '--name-only', revision, '--', path)
+    else:
+        listed = _git('ls-files', '--cached', '--', path)
+    # 只有该版本中确实不存在此文件时才视为空，其余 git 错误向上抛出
+    content = _git('show', spec) if listed.strip() else ''
+    try:
+        with _span('parse:' + name):
+            return cache.cached_content_parse(key, content.encode('utf-8'), parse, **_record_codec(record_type))
+    except TsParseError as e:
+        e.file = f'{revision}:{path}' if revision else path
+        raise
+
+def _load_data_records(name: str, parse: Callable[[str], Any], record_type: type,
+                       cache: ScanCache, staged: bool) -> Any:
+    """读取当前数据文件记录；staged 模式下读取暂存区中的内容"""
+    if not staged:
+        return _read_data_file(name, parse, cache, **_record_codec(record_type))
+    return _load_git_records(name, parse, record_type, cache, '', 'data/' + name)
+
+def analyze_changed(cache: ScanCache, since: Optional[str] = None, staged: bool = False,
+                    walk: Optional[Dict[str, List[CommandEntry]]] = None) -> Dict:
+    """只计算 git 变更涉及的同步差异
+
+    目录扫描结果经缓存校验（访问过的目录 mtime 均未变化才复用，否则重新扫描该来源），
+    再按变更路径逐个修补为工作区中的状态；staged 模式下目录与数据文件均取自暂存区，
+    与即将提交的内容一致。发生变化的数据文件以 since（默认 HEAD）
+    中的版本为基线，对比新旧记录找出受影响的命令，最后把差异集合限定到这些命令。
+
+    Returns:
+        与 analyze_commands 相同结构的结果，另含 changed_paths 和 affected
+    """
+    with _span('analyze'):
+        with _span('git'):
+            changed = git_changed_paths(since, staged)
+
+        with _span('scan'):
+            touched: Dict[str, Set[CommandEntry]] = {}
+            for path in changed:
+                entry = _entry_for_path(path)
+                if entry:
+                    touched.setdefault(entry.source, set()).add(entry)
+
+            if staged:
+                # 以暂存区中的全部命令为准：未暂存的工作区改动（如未跟踪的技能目录）不属于本次提交
+                scans = index_entries()
+            else:
+                present = _entries_present(set().union(*touched.values()))
+                scans = {}
+                for source, _, _ in SCAN_ROOTS:
+                    # 不能直接取上次完整运行的清单：只经数据文件变更影响的命令也要对照当前目录
+                    baseline = [e for e in walk[source] if e.synced] if walk is not None \
+                        else scan_root(source, cache)
+                    entries = touched.get(source, set())
+                    names = {e.name for e in entries}
+                    scans[source] = [e for e in baseline if e.name not in names] + \
+                                    sorted(e for e in entries if e in present)
+
+        affected = {e.name for entries in touched.values() for e in entries}
+        loaded = {}
+        with _span('ts_extract'):
+            for name, parse, record_type in (('commands.ts', parse_commands_ts, Command),
+                                             ('deprecated.ts', parse_deprecated_ts, DeprecatedCommand),
+                                             ('patterns.ts', parse_pattern_steps, PatternStep)):
+                loaded[name] = _load_data_records(name, parse, record_type, cache, staged)
+                if 'src/data/' + name in changed:
+                    # 基线取自 git 中的比较基准，而不是上次运行时的工作区内容
+                    loaded[name + ':baseline'] = _load_git_records(name, parse, record_type, cache,
+                                                                   since or 'HEAD', 'git/data/' + name)
+
+        result = compute_sync_diff(scans, loaded['commands.ts'], loaded['deprecated.ts'],
+                                   loaded['patterns.ts'])
+
+        # 数据文件中新增或删除的命令
+        for name, attr in (('commands.ts', 'cmd'), ('patterns.ts', 'cmd')):
+            if name + ':baseline' in loaded:
+                before = {getattr(r, attr) for r in loaded[name + ':baseline']}
+                after = {getattr(r, attr) for r in loaded[name]}
+                affected |= before ^ after
+        if 'deprecated.ts:baseline' in loaded:
+            # 废弃规则变化：比较新旧规则下每个已知命令的解析结果
+            before = DeprecationIndex(loaded['deprecated.ts:baseline'])
+            after = result['deprecations']
+            outcome = lambda d: d and (d.rule.old, d.terminal, d.cycle, d.into_cycle)
+            affected |= {cmd for cmd in result['all_actual'] | result['ts_commands'] | result['pattern_commands']
+                         if outcome(before.lookup(cmd)) != outcome(after.lookup(cmd))}
+
+        for key in DELTA_KEYS:
+            result[key] = result[key] & affected
+        result['changed_paths'] = changed
+        result['affected'] = affected
+        return result
+
+# ============================================
+# 命令索引（SQLite）
+# ============================================
+
+# 命令索引格式版本：表结构变化时递增，旧版本索引在查询前重新生成
+INDEX_SCHEMA_VERSION = 1
+
+_INDEX_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE commands (
+    cmd TEXT PRIMARY KEY,
+    source TEXT,          -- 优先来源根（claude/commands 等），目录中不存在时为 NULL
+    path TEXT,            -- 相对仓库根目录的文件或技能目录路径
+    category TEXT,        -- 以下四项来自 commands.ts，未定义时为 NULL
+    cli TEXT,
+    status TEXT,
+    description TEXT,
+    ts_line INTEGER,
+    deprecated_rule TEXT, -- 命中的废弃规则（可能是 /ns:* 通配）
+    replacement TEXT,     -- 最终替代命令，已移除或成环时为 NULL
+    in_patterns INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE deprecations (
+    old TEXT PRIMARY KEY,
+    new_cmd TEXT,
+    reason TEXT,
+    deprecated_in TEXT,
+    line INTEGER
+) WITHOUT ROWID;
+"""
+
+class IndexedCommand(NamedTuple):
+    """命令索引中的一行"""
+    cmd: str
+    source: Optional[str]
+    path: Optional[str]
+    category: Optional[str]
+    cli: Optional[str]
+    status: Optional[str]
+    description: Optional[str]
+    ts_line: Optional[int]
+    deprecated_rule: Optional[str]
+    replacement: Optional[str]
+    in_patterns: bool
+
+# 按列名读写，不依赖表中列的顺序
+_INDEX_COLUMNS = ', '.join(IndexedCommand._fields)
+_INDEX_PARAMS = ', '.join('?' * len(IndexedCommand._fields))
+
+def read_index_meta(path: Path, key: str) -> Optional[str]:
+    """读取命令索引 meta 表中的一项，索引不存在或无法读取时返回 None"""
+    try:
+        with closing(sqlite3.connect(f'file:{path}?mode=ro', uri=True)) as conn:
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+def _entry_path(entry: CommandEntry) -> str:
+    return f'.{entry.source}/{entry.rel_path}'
+
+def build_index_rows(result: Dict) -> List[IndexedCommand]:
+    """由分析结果生成索引行：目录、commands.ts、patterns.ts 与废弃列表中出现过的全部命令"""
+    ts = {}
+    for c in result['ts_records']:
+        ts.setdefault(c.cmd, c)
+    deprecations = result['deprecations']
+    names = result['all_actual'] | set(ts) | result['pattern_commands'] | \
+        {old for old in result['deprecated'] if not old.endswith(':*')}
+
+    rows = []
+    for cmd in sorted(names):
+        entry = result['index'].get(cmd)
+        c = ts.get(cmd)
+        deprecation = deprecations.lookup(cmd)
+        rows.append(IndexedCommand(
+            cmd,
+            entry.source if entry else None, _entry_path(entry) if entry else None,
+            c.category if c else None, c.cli if c else None, c.status if c else None,
+            c.desc if c else None, c.line if c else None,
+            deprecation.rule.old if deprecation else None,
+            deprecation.terminal if deprecation else None,
+            cmd in result['pattern_commands'],
+        ))
+    return rows
+
+def write_command_index(result: Dict, path: Optional[Path] = None) -> bool:
+    """写出命令索引（内容未变化时跳过），返回是否重新生成
+
+    索引只是查询加速，写入失败（如 .ccw 不可写）时与 ScanCache.save 一样静默跳过，
+    不影响本次检查结果。
+    """
+    path = path or INDEX_FILE
+    rows = build_index_rows(result)
+    rules = [(d.old, d.new_cmd, d.reason, d.deprecated_in, d.line)
+             for d in result['deprecations'].records]
+    fingerprint = hashlib.sha256(json.dumps([rows, rules], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    with _span('index'):
+        if read_index_meta(path, 'schema_version') == str(INDEX_SCHEMA_VERSION) \
+                and read_index_meta(path, 'fingerprint') == fingerprint:
+            return False
+
+        # 先写临时文件再替换，查询方不会读到半成品
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if tmp_path.exists():
+                tmp_path.unlink()
+            with closing(sqlite3.connect(tmp_path)) as conn:
+                conn.executescript(_INDEX_SCHEMA)
+                conn.executemany(f'INSERT INTO commands ({_INDEX_COLUMNS}) VALUES ({_INDEX_PARAMS})', rows)
+                conn.executemany('INSERT OR IGNORE INTO deprecations VALUES (?, ?, ?, ?, ?)', rules)
+                conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+                    ('schema_version', str(INDEX_SCHEMA_VERSION)),
+                    ('fingerprint', fingerprint),
+                    ('generated', time.strftime('%Y-%m-%dT%H:%M:%S')),
+                ])
+                conn.commit()
+            os.replace(tmp_path, path)
+        except (OSError, sqlite3.Error):
+            return False
+        _count('index_rows', len(rows))
+        return True
+
+class CommandIndex:
+    """只读打开命令索引，按命令名或命名空间前缀查询，不访问扫描目录"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or INDEX_FILE
+        self.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        self._deprecations: Optional[DeprecationIndex] = None
+
+    def close(self):
+        self.conn.close()
+
+    def generated(self) -> str:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'generated'").fetchone()
+        return row[0] if row else ''
+
+    def get(self, cmd: str) -> Optional[IndexedCommand]:
+        row = self.conn.execute(f'SELECT {_INDEX_COLUMNS} FROM commands WHERE cmd = ?', (cmd,)).fetchone()
+        return IndexedCommand(*row[:-1], bool(row[-1])) if row else None
+
+    def prefix(self, prefix: str) -> List[IndexedCommand]:
+        # 主键范围查询：prefix <= cmd < prefix + U+10FFFF
+        rows = self.conn.execute(f'SELECT {_INDEX_COLUMNS} FROM commands WHERE cmd >= ? AND cmd < ? ORDER BY cmd',
+                                 (prefix, prefix + '\U0010ffff'))
+        return [IndexedCommand(*row[:-1], bool(row[-1])) for row in rows]
+
+    def deprecation(self, cmd: str) -> Optional[Deprecation]:
+        """按索引中的废弃规则解析任意命令（含未收录的命令，如通配规则覆盖的子命令）"""
+        if self._deprecations is None:
+            rows = self.conn.execute('SELECT old, new_cmd, reason, deprecated_in, line FROM deprecations ORDER BY line')
+            self._deprecations = DeprecationIndex([DeprecatedCommand(*row, 0) for row in rows])
+        return self._deprecations.lookup(cmd)
+
+def print_indexed(item: IndexedCommand):
+    """打印单个命令的索引信息"""
+    print(item.cmd)
+    if item.source:
+        print(f"  来源: {item.source} ({item.path})")
+    else:
+        print("  来源: 目录中不存在")
+    if item.ts_line is not None:
+        print(f"  commands.ts:{item.ts_line}: category={item.category} cli={item.cli} status={item.status}")
+        if item.description:
+            print(f"  说明: {item.description}")
+    else:
+        print("  commands.ts: 未定义")
+    if item.deprecated_rule:
+        hint = f"-> 使用 {item.replacement}" if item.replacement else "[已移除]"
+        print(f"  已废弃 ({item.deprecated_rule}) {hint}")
+    if item.in_patterns:
+        print("  被 patterns.ts 命令链引用")
+
+# ============================================
+# 流式 NDJSON 输出
+# ============================================
+
+# --ndjson 模式的退出码（2 留给 argparse 的用法错误）
+EXIT_SYNCED = 0       # 完全同步
+EXIT_DRIFT = 1        # 存在差异
+EXIT_PARSE_ERROR = 3  # 数据文件解析失败
+EXIT_ERROR = 4        # 其他错误（如 git 命令失败）
+
+# 只作提示、不计入差异状态的发现（与文本报告和 --json 的 synced 判定一致）
+ADVISORY_FINDINGS = {'deprecation_cycle'}
+
+class Finding(NamedTuple):
+    """一条同步差异"""
+    kind: str              # missing / extra / stale / pattern_orphan / deprecation_cycle
+    cmd: str
+    source: Optional[str]  # 目录来源根，目录中不存在时为 None
+    fix: str               # 修复建议
+    file: Optional[str]    # 定位：相对仓库根目录的文件
+    line: Optional[int]
+
+def iter_findings(scans: Iterator[Tuple[str, List[CommandEntry]]], ts_records: List[Command],
+                  deprecated_records: List[DeprecatedCommand], pattern_steps: List[PatternStep],
+                  affected: Optional[Set[str]] = None) -> Iterator[Finding]:
+    """逐条产出同步差异，不构建完整结果
+
+    Args:
+        scans: 按 SCAN_ROOTS 优先级顺序产出 (来源名, 命令记录)，每个来源可用时即处理
+        affected: 只产出这些命令的差异（增量模式）
+    """
+    ts_commands = {c.cmd for c in ts_records}
+    deprecations = DeprecationIndex(deprecated_records)
+    wanted = (lambda cmd: cmd in affected) if affected is not None else (lambda cmd: True)
+
+    # 目录中的命令：同名命令归属最先出现的来源
+    actual: Set[str] = set()
+    for _, entries in scans:
+        for entry in entries:
+            cmd = entry.name
+            if cmd in actual:
+                continue
+            actual.add(cmd)
+            if not wanted(cmd):
+                continue
+            path = _entry_path(entry)
+            if cmd not in ts_commands:
+                yield Finding('missing', cmd, entry.source, '在 src/data/commands.ts 中添加该命令', path, None)
+            deprecation = deprecations.lookup(cmd)
+            if deprecation:
+                yield Finding('stale', cmd, entry.source,
+                              f'删除 {path}，{describe_deprecation(deprecation)}', path, None)
+
+    reported: Set[str] = set()
+    for c in ts_records:
+        if c.cmd in actual or c.cmd in reported or not wanted(c.cmd):
+            continue
+        reported.add(c.cmd)
+        if deprecations.lookup(c.cmd):
+            fix = '已在 deprecated.ts 中废弃，从 commands.ts 删除'
+        else:
+            fix = f"移入 src/data/deprecated.ts: {{ old: '{c.cmd}', newCmd: null, reason: '命令已移除' }}"
+        yield Finding('extra', c.cmd, None, fix, 'src/data/commands.ts', c.line)
+
+    reported.clear()
+    for step in pattern_steps:
+        if step.cmd in actual or step.cmd in ts_commands or step.cmd in reported or not wanted(step.cmd):
+            continue
+        reported.add(step.cmd)
+        yield Finding('pattern_orphan', step.cmd, None, '修正引用或在 commands.ts 中定义该命令',
+                      'src/data/patterns.ts', step.line)
+
+    for d in sorted(deprecations.cycles(), key=lambda d: d.rule.line):
+        if wanted(d.rule.old):
+            yield Finding('deprecation_cycle', d.rule.old, None,
+                          f"替代链成环: {' -> '.join(d.chain)}，请指定最终替代命令",
+                          'src/data/deprecated.ts', d.rule.line)
+
+def stream_findings(cache: Optional[ScanCache] = None) -> Iterator[Finding]:
+    """完整分析的流式版本：目录扫描在后台并发进行，数据文件解析完后按来源优先级逐个消费扫描结果"""
+    with ThreadPoolExecutor(max_workers=len(SCAN_ROOTS)) as pool:
+        futures = [(name, pool.submit(scan_root, name, cache)) for name, _, _ in SCAN_ROOTS]
+        ts_records = load_ts_commands(cache)
+        deprecated_records = load_deprecated_commands(cache)
+        pattern_steps = load_pattern_steps(cache)
+        scans = ((name, future.result()) for name, future in futures)
+        yield from iter_findings(scans, ts_records, deprecated_records, pattern_steps)
+
+def _write_ndjson(record: Dict[str, Any]):
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+    sys.stdout.flush()
+
+def run_ndjson(args: argparse.Namespace) -> int:
+    """--ndjson：每发现一条差异即输出一行 JSON，最后输出汇总行，返回退出码"""
+    try:
+        return _run_ndjson(args)
+    except BrokenPipeError:
+        # 下游提前关闭管道（如 | head）：之后的输出全部丢弃，避免解释器退出时 flush 再次报错
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return EXIT_ERROR
+
+def _run_ndjson(args: argparse.Namespace) -> int:
+    cache = ScanCache(enabled=not args.no_cache, rebuild=args.rebuild_cache)
+    counts: Dict[str, int] = {}
+    try:
+        if args.since or args.staged:
+            result = analyze_changed(cache, since=args.since, staged=args.staged)
+            findings = iter_findings(iter(result['scans'].items()), result['ts_records'],
+                                     result['deprecations'].records, result['pattern_steps'],
+                                     affected=result['affected'])
+        else:
+            findings = stream_findings(cache)
+        for finding in findings:
+            counts[finding.kind] = counts.get(finding.kind, 0) + 1
+            _write_ndjson(finding._asdict())
+    except TsParseError as e:
+        _write_ndjson({'kind': 'error', 'error': 'parse', 'message': e.message, 'file': e.file,
+                       'line': e.line, 'col': e.col})
+        return EXIT_PARSE_ERROR
+    except GitError as e:
+        _write_ndjson({'kind': 'error', 'error': 'git', 'message': str(e)})
+        return EXIT_ERROR
+    except BrokenPipeError:
+        raise
+    except Exception as e:
+        # 其余意外错误也以错误行结束输出，调用方始终能按退出码区分
+        _write_ndjson({'kind': 'error', 'error': 'internal', 'message': f'{type(e).__name__}: {e}'})
+        return EXIT_ERROR
+
+    # 增量模式也写回缓存，git 基线的解析结果可供下一次钩子调用复用
+    cache.save()
+    drift = any(kind not in ADVISORY_FINDINGS for kind in counts)
+    _write_ndjson({'kind': 'summary', 'status': 'drift' if drift else 'synced', 'counts': counts})
+    return EXIT_DRIFT if drift else EXIT_SYNCED
+
+# ============================================
+# 多仓库批量分析
+# ============================================
+
+def read_manifest(path: Path) -> List[str]:
+    """读取仓库清单：每行一个根目录，# 开头为注释，相对路径相对清单文件所在目录"""
+    roots = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                roots.append(str((path.parent / line).resolve()))
+    return roots
+
+def _analyze_repo(root: str, use_cache: bool, rebuild: bool) -> Tuple[Dict, Optional[Dict[str, Any]]]:
+    """进程池工作函数：分析单个仓库
+
+    Returns:
+        (报告条目, 供跨仓库对比的命令集合)，分析失败时后者为 None
+    """
+    set_root(Path(root))
+    if not ROOT_DIR.is_dir():
+        return {'root': root, 'error': '目录不存在'}, None
+
+    cache = ScanCache(enabled=use_cache, rebuild=rebuild)
+    try:
+        result = analyze_commands(cache)
+    except TsParseError as e:
+        return {'root': root, 'error': f'数据文件解析失败: {e}'}, None
+    except Exception as e:
+        # 单个仓库的意外错误（如数据文件不是 UTF-8）只记入该仓库的报告，不中断整批
+        return {'root': root, 'error': f'{type(e).__name__}: {e}'}, None
+    cache.save()
+
+    sets = {
+        'live': sorted(result['all_actual']),
+        'ts': sorted(result['ts_commands']),
+        'deprecations': [list(d) for d in result['deprecations'].records],
+    }
+    return {'root': root, **summarize_result(result)}, sets
+
+def compare_repos(sets: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """跨仓库对比：列出在各仓库中状态不一致的命令及其在各仓库中的状态
+
+    状态：present（目录中存在）、declared（仅 commands.ts 定义）、deprecated（已废弃，附最终替代命令）、
+    missing（不存在）。所有仓库状态相同（废弃时最终替代命令也相同）的命令不算差异。
+    """
+    live = {root: set(s['live']) for root, s in sets.items()}
+    ts = {root: set(s['ts']) for root, s in sets.items()}
+    deprecations = {root: DeprecationIndex([DeprecatedCommand(*row) for row in s['deprecations']])
+                    for root, s in sets.items()}
+
+    def status(root: str, cmd: str) -> Tuple[str, Optional[str]]:
+        if cmd in live[root]:
+            return 'present', None
+        deprecation = deprecations[root].lookup(cmd)
+        if deprecation:
+            return 'deprecated', deprecation.terminal
+        return ('declared' if cmd in ts[root] else 'missing'), None
+
+    diffs = {}
+    for cmd in sorted(set().union(*live.values(), *ts.values())):
+        statuses = {root: status(root, cmd) for root in sets}
+        if len(set(statuses.values())) == 1:
+            continue
+        entry: Dict[str, Any] = {}
+        for root, (state, terminal) in statuses.items():
+            if state == 'deprecated':
+                entry.setdefault('deprecated', {})[root] = terminal
+            else:
+                entry.setdefault(state, []).append(root)
+        diffs[cmd] = entry
+    return diffs
+
+def analyze_batch(roots: List[str], jobs: Optional[int] = None, use_cache: bool = True,
+                  rebuild: bool = False) -> Dict[str, Any]:
+    """用进程池并行分析多个仓库，返回汇总报告"""
+    # 去重并保持顺序
+    roots = list(dict.fromkeys(str(Path(root).resolve()) for root in roots))
+    with _span('batch'):
+        with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count() or 1, len(roots))) as pool:
+            futures = [pool.submit(_analyze_repo, root, use_cache, rebuild) for root in roots]
+            outcomes = []
+            for root, future in zip(roots, futures):
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    # 工作进程异常退出（BrokenProcessPool）或结果无法回传
+                    outcomes.append(({'root': root, 'error': f'{type(e).__name__}: {e}'}, None))
+
+        with _span('compare'):
+            reports = [report for report, _ in outcomes]
+            sets = {report['root']: s for report, s in outcomes if s is not None}
+            cross_repo = compare_repos(sets) if len(sets) > 1 else {}
+
+    return {
+        'summary': {
+            'repos': len(reports),
+            'errors': sum(1 for r in reports if 'error' in r),
+            'synced': sum(1 for r in reports if r.get('synced')),
+            'divergent_commands': len(cross_repo),
+        },
+        'repos': reports,
+        'cross_repo': cross_repo,
+    }
+
+# ============================================
+# 监视模式
+# ============================================
+
+# 监视模式下跟踪增减的差异集合
+DELTA_KEYS = ('missing', 'extra', 'stale_in_dirs', 'pattern_orphans')
+
+def _stat_snapshot(paths: Set[str]) -> Dict[str, Optional[Tuple[int, int]]]:
+    """对路径逐个 stat，返回 {路径: (mtime_ns, size)}，不存在的路径为 None"""
+    snapshot = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            snapshot[path] = None
+    return snapshot
+
+def diff_results(old: Dict, new: Dict) -> Dict[str, Dict[str, List[str]]]:
+    """对比两次分析结果，返回 {差异类型: {'added': [...], 'removed': [...]}}（仅含有变化的类型）"""
+    delta = {}
+    for key in DELTA_KEYS:
+        added = new[key] - old[key]
+        removed = old[key] - new[key]
+        if added or removed:
+            delta[key] = {'added': sorted(added), 'removed': sorted(removed)}
+    return delta
+
+def print_delta(delta: Dict[str, Dict[str, List[str]]], result: Dict):
+    """打印一次变化批次的差异增减"""
+    stamp = time.strftime('%H:%M:%S')
+    if not delta:
+        print(f"[{stamp}] 检测到文件变化，同步差异无变化")
+        return
+
+    print(f"[{stamp}] 同步差异变化:")
+    for key, change in delta.items():
+        for cmd in change['added']:
+            source = get_command_source(cmd, result['index'])
+            print(f"  + {key:16} {cmd:40} [{source}]")
+        for cmd in change['removed']:
+            print(f"  - {key:16} {cmd}")
+    issues = sum(len(result[key]) for key in DELTA_KEYS)
+    print(f"  当前共 {issues} 项待处理" if issues else "  SUCCESS: 所有命令完全同步!")
+
+def watch_commands(cache: ScanCache, interval: float = 1.0, debounce: float = 0.5,
+                   as_json: bool = False, scanned_path: Optional[Path] = None):
+    """监视模式：目录与数据文件解析结果常驻内存，轮询 stat 检测变化后增量重算
+
+    一次变化突发（如 git checkout）会等待路径状态连续 debounce 秒不再变化后才重算，
+    避免反复分析。指定 scanned_path 时每次重算后同步更新命令清单。
+    启动时数据文件解析失败（如正在编辑）不退出，等文件修复后再输出完整报告。
+    """
+    def report_full(result: Dict):
+        if as_json:
+            print(json.dumps({key: sorted(result[key]) for key in DELTA_KEYS}, ensure_ascii=False), flush=True)
+        else:
+            print_report(result)
+            sys.stdout.flush()
+
+    def report_parse_error(error: TsParseError):
+        # 编辑过程中的半成品文件，等待下一次变化
+        print(f"[{time.strftime('%H:%M:%S')}] 数据文件解析失败: {error}", file=sys.stderr, flush=True)
+
+    walk = walk_all(cache)
+    if scanned_path:
+        emit_scanned_commands(scanned_path, walk, cache)
+    result: Optional[Dict] = None
+    try:
+        result = analyze_commands(cache, walk)
+    except TsParseError as e:
+        report_parse_error(e)
+    cache.save()
+    if result is not None:
+        if cache.persist:
+            write_command_index(result)
+        report_full(result)
+    if not as_json:
+        print(f"\n监视中（每 {interval:g}s 轮询，Ctrl+C 退出）...", flush=True)
+
+    previous = _stat_snapshot(cache.watched)
+    try:
+        while True:
+            time.sleep(interval)
+            current = _stat_snapshot(set(previous))
+            if current == previous:
+                continue
+
+            # 防抖：等待变化平息
+            while True:
+                time.sleep(debounce)
+                settled = _stat_snapshot(set(previous))
+                if settled == current:
+                    break
+                current = settled
+
+            walk = walk_all(cache)
+            if scanned_path:
+                # 命令清单不依赖数据文件，即使随后解析失败也先更新
+                emit_scanned_commands(scanned_path, walk, cache)
+            try:
+                new_result = analyze_commands(cache, walk)
+            except TsParseError as e:
+                report_parse_error(e)
+                previous = {**_stat_snapshot(cache.watched), **current}
+                continue
+            cache.save()
+            if cache.persist:
+                write_command_index(new_result)
+            if result is None:
+                # 启动时解析失败，首次成功的分析输出完整报告
+                report_full(new_result)
+            else:
+                delta = diff_results(result, new_result)
+                if as_json:
+                    print(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'delta': delta},
+                                     ensure_ascii=False), flush=True)
+                else:
+                    print_delta(delta, new_result)
+                    sys.stdout.flush()
+            result = new_result
+
+            # 分析期间新增的依赖路径取当前状态；原有路径保留重算前状态，
+            # 重算期间发生的变化会在下一轮轮询中被发现
+            previous = {**_stat_snapshot(cache.watched), **current}
+    except KeyboardInterrupt:
+        cache.save()
+
 def main():
     parser = argparse.ArgumentParser(description='同步 commands.ts 与目录中的实际命令')
     parser.add_argument('--fix', action='store_true', help='生成修复建议')
     parser.add_argument('--json', action='store_true', help='输出 JSON 格式')
+    parser.add_argument('--no-cache', action='store_true', help='不读写扫描缓存与命令索引')
+    parser.add_argument('--rebuild-cache', action='store_true', help='忽略已有缓存并重新生成')
+    parser.add_argument('--watch', action='store_true', help='监视模式：文件变化时仅输出差异增减')
+    parser.add_argument('--interval', type=float, default=1.0, help='监视模式轮询间隔（秒），默认 1')
+    parser.add_argument('--debounce', type=float, default=0.5, help='监视模式防抖静默时间（秒），默认 0.5')
+    parser.add_argument('--profile', action='store_true', help='在 stderr 输出各阶段耗时与计数器汇总表')
+    parser.add_argument('--trace', type=Path, metavar='FILE', help='输出 Chrome trace-event JSON 到 FILE')
+    parser.add_argument('--since', metavar='REF',
+                        help='只检查相对 REF 的变更（含未提交与未跟踪文件）涉及的命令')
+    parser.add_argument('--staged', action='store_true', help='只检查暂存区变更涉及的命令（pre-commit）')
+    parser.add_argument('--query', metavar='CMD', help='从命令索引查询单个命令（不扫描目录）')
+    parser.add_argument('--prefix', metavar='PREFIX', help='从命令索引列出以 PREFIX 开头的命令，如 /workflow:')
+    parser.add_argument('--skill-dups', action='store_true',
+                        help='对比 .claude 与 .codex 技能内容，报告完全一致、近似重复和已分化的技能')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='流式输出：每条差异一行 JSON，退出码 0 同步 / 1 有差异 / 3 解析失败 / 4 其他错误')
+    parser.add_argument('--batch', nargs='+', metavar='ROOT', help='批量分析多个仓库根目录，输出汇总 JSON')
+    parser.add_argument('--manifest', type=Path, metavar='FILE', help='从 FILE 读取要批量分析的仓库根目录（每行一个）')
+    parser.add_argument('--jobs', type=int, metavar='N', help='批量模式的并行进程数，默认 CPU 核数')
+    parser.add_argument('--check-refs', action='store_true',
+                        help='校验数据文件与 .claude/.codex 文档中引用的废弃或不存在的命令'
+                             '（不存在的命令只能通过已知命令的 : 或 - 前缀识别，如 /workflow:、/team-）')
+    parser.add_argument('--emit-scanned', type=Path, nargs='?', const=SCANNED_FILE, metavar='FILE',
+                        help='同时生成前端命令清单，默认写入 public/commands-scanned.json')
+    parser.add_argument('--quiet', action='store_true',
+                        help='与 --emit-scanned 一起使用：只生成命令清单，不解析数据文件、不输出检查报告')
     args = parser.parse_args()
-
-    result = analyze_commands()
-
-    if args.json:
-        # JSON 输出
-        output = {
-            'total_actual': result['total_actual'],
-            'total_ts': result['total_ts'],
-            'total_deprecated': result['total_deprecated'],
-            'missing': sorted(list(result['missing'])),
-            'extra': sorted(list(result['extra'])),
-            'stale_in_dirs': sorted(list(result['stale_in_dirs'])),
-            'pattern_orphans': sorted(list(result['pattern_orphans'])),
-            'synced': not result['missing'] and not result['extra'] and not result['stale_in_dirs'],
-        }
-        print(json.dumps(output, indent=2, ensure_ascii=False))
-    else:
-        # 文本报告
-        print_report(result)
-
-        if args.fix:
-            print(generate_fix_suggestions(result))
+    if args.watch and (args.since or args.staged):
+        parser.error('--since/--staged 不能与 --watch 同时使用')
+    if (args.batch or args.manifest) and (args.watch or args.since or args.staged):
+        parser.error('--batch/--manifest 不能与 --watch、--since、--staged 同时使用')
+    if args.ndjson and (args.json or args.watch or args.batch or args.manifest or args.check_refs or args.emit_scanned
+                        or args.skill_dups or args.fix or args.query or args.prefix):
+        parser.error('--ndjson 不能与 --json、--watch、--batch、--manifest、--check-refs、--emit-scanned、'
+                     '--skill-dups、--fix、--query、--prefix 同时使用')
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs 必须大于等于 1')
+    if args.quiet and not args.emit_scanned:
+        parser.error('--quiet 需要与 --emit-scanned 同时使用')
+    if args.quiet and (args.json or args.ndjson or args.fix or args.watch or args.batch or args.manifest
+                       or args.since or args.staged or args.query or args.prefix or args.check_refs
+                       or args.skill_dups):
+        parser.error('--quiet 只生成命令清单，不能与检查、查询、监视或批量选项同时使用')
+
+    profiler = enable_profiling() if args.profile or args.trace else None
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            if args.profile:
+                profiler.print_summary()
+            if args.trace:
+                profiler.write_trace(args.trace)
+
+def query_index(args: argparse.Namespace):
+    """--query/--prefix：只读命令索引，索引不存在或格式版本不符时先完整分析一次生成"""
+    if read_index_meta(INDEX_FILE, 'schema_version') != str(INDEX_SCHEMA_VERSION):
+        cache = ScanCache(enabled=not args.no_cache, rebuild=args.rebuild_cache)
+        try:
+            result = analyze_commands(cache)
+        except TsParseError as e:
+            sys.exit(f'数据文件解析失败: {e}')
+        cache.save()
+        # 查询必须有索引，--no-cache 时也生成
+        write_command_index(result)
+        if read_index_meta(INDEX_FILE, 'schema_version') != str(INDEX_SCHEMA_VERSION):
+            sys.exit(f'无法写入命令索引: {INDEX_FILE}')
+
+    with _span('query'), closing(CommandIndex()) as index:
+        found = index.get(args.query) if args.query else None
+        # 未收录的命令仍可能被通配规则废弃
+        deprecation = index.deprecation(args.query) if args.query and not found else None
+        matches = index.prefix(args.prefix) if args.prefix else []
+
+        if args.json:
+            output = {'generated': index.generated()}
+            if args.query:
+                output['query'] = found._asdict() if found else None
+                if deprecation:
+                    output['deprecation'] = {'rule': deprecation.rule.old, 'replacement': deprecation.terminal}
+            if args.prefix:
+                output['prefix'] = [item._asdict() for item in matches]
+            print(json.dumps(output, indent=2, ensure_ascii=False))
+            return
+
+        if args.query:
+            if found:
+                print_indexed(found)
+            elif deprecation:
+                hint = f"-> 使用 {deprecation.terminal}" if deprecation.terminal else "[已移除]"
+                print(f"{args.query}\n  未收录，但被废弃规则 {deprecation.rule.old} 覆盖 {hint}")
+            else:
+                print(f"{args.query}: 不存在")
+        if args.prefix:
+            print(f"以 {args.prefix} 开头的命令 ({len(matches)}):")
+            for item in matches:
+                status = item.source or '目录中不存在'
+                if item.deprecated_rule:
+                    status += f", 已废弃 -> {item.replacement}" if item.replacement else ", 已废弃"
+                print(f"  {item.cmd:40} [{status}]")
+
+def run(args: argparse.Namespace):
+    if args.query or args.prefix:
+        query_index(args)
+        return
+
+    if args.ndjson:
+        sys.exit(run_ndjson(args))
+
+    if args.batch or args.manifest:
+        roots = list(args.batch or [])
+        if args.manifest:
+            try:
+                roots += read_manifest(args.manifest)
+            except OSError as e:
+                sys.exit(f'无法读取仓库清单: {e}')
+        if not roots:
+            sys.exit(f'仓库清单为空: {args.manifest}')
+        report = analyze_batch(roots, jobs=args.jobs, use_cache=not args.no_cache, rebuild=args.rebuild_cache)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    if args.watch:
+        # 监视模式始终使用进程内缓存；--no-cache 时不读写磁盘清单
+        cache = ScanCache(rebuild=args.rebuild_cache, persist=not args.no_cache)
+        watch_commands(cache, interval=args.interval, debounce=args.debounce, as_json=args.json,
+                       scanned_path=args.emit_scanned)
+        return
+
+    cache = ScanCache(enabled=not args.no_cache, rebuild=args.rebuild_cache)
+    incremental = bool(args.since or args.staged)
+    # 同时生成命令清单时只遍历一次目录，同步检查与清单各自从中筛选
+    walk = walk_all(cache) if args.emit_scanned else None
+    if args.emit_scanned:
+        # 清单只依赖目录与 Markdown 文件，先于数据文件解析写出，数据文件有语法错误也不影响构建
+        scanned = emit_scanned_commands(args.emit_scanned, walk, cache)
+        sources = scanned['_metadata']['sources']
+        print(f"已生成 {args.emit_scanned}: {scanned['_metadata']['total_commands']} 个命令 "
+              f"(claude 命令 {sources['claude_commands']}, claude 技能 {sources['claude_skills']}, "
+              f"codex 提示词 {sources['codex_prompts']}, codex 技能 {sources['codex_skills']})",
+              file=sys.stderr)
+        if args.quiet:
+            cache.save()
+            return
+
+    try:
+        if incremental:
+            result = analyze_changed(cache, since=args.since, staged=args.staged, walk=walk)
+        else:
+            result = analyze_commands(cache, walk)
+    except TsParseError as e:
+        sys.exit(f'数据文件解析失败: {e}')
+    except GitError as e:
+        sys.exit(f'git 命令失败: {e}')
+    skill_pairs = None
+    if args.skill_dups:
+        with _span('skills'):
+            skill_pairs = compare_skills(fingerprint_skills(result['scans'], cache))
+
+    cache.save()
+    if not incremental and not args.no_cache:
+        # 增量模式的扫描结果只是在基线上修补，不写入命令索引；--no-cache 时不写 .ccw
+        write_command_index(result)
+
+    refs = None
+    if args.check_refs:
+        files = None
+        if incremental:
+            # 只校验发生变化且仍存在的文件
+            files = [str(ROOT_DIR / p) for p in sorted(result['changed_paths'])
+                     if (p.endswith('.md') or (p.startswith('src/data/') and p.endswith('.ts')
+                                               and p[len('src/data/'):] not in REF_SKIP_DATA_FILES))
+                     and (ROOT_DIR / p).is_file()]
+        refs = check_references(result, files)
+
+    with _span('report'):
+        if args.json:
+            # JSON 输出
+            output = summarize_result(result)
+            if incremental:
+                output['changed_paths'] = sorted(result['changed_paths'])
+                output['affected'] = sorted(result['affected'])
+            if refs is not None:
+                output['references'] = [ref._asdict() for ref in refs]
+            if skill_pairs is not None:
+                output['skill_pairs'] = [pair._asdict() for pair in skill_pairs]
+            print(json.dumps(output, indent=2, ensure_ascii=False))
+        else:
+            # 文本报告
+            if incremental:
+                base = '暂存区' if args.staged else '工作区'
+                print(f"增量模式：{base}相对 {args.since or 'HEAD'} 变更 {len(result['changed_paths'])} 个路径，"
+                      f"涉及 {len(result['affected'])} 个命令，以下仅列出这些命令的差异")
+            print_report(result)
+            if refs is not None:
+                print_reference_report(refs)
+            if skill_pairs is not None:
+                print_skill_report(skill_pairs)
+
+            if args.fix:
+                print(generate_fix_suggestions(result))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,825 @@
+"""
+scripts/sync-commands.py 的单元测试
+
+运行：
+  python -m pytest scripts/tests
+  python -m unittest discover scripts/tests
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import closing, redirect_stdout
+from unittest import mock
+from pathlib import Path
+
+_SCRIPT = Path(__file__).resolve().parent.parent / 'sync-commands.py'
+_spec = importlib.util.spec_from_file_location('sync_commands', _SCRIPT)
+sync = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(sync)
+
+
+def _objects(source: str):
+    return [obj.fields for obj in sync.iter_ts_objects(source)]
+
+
+class TempRootTestCase(unittest.TestCase):
+    """以临时目录作为仓库根目录（sync.set_root），测试结束后恢复原根目录"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(sync.set_root, sync.ROOT_DIR)
+        self.root = tmp.name
+        sync.set_root(sync.Path(self.root))
+
+    def _write(self, rel: str, text: str):
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+# ============================================
+# 性能剖析
+# ============================================
+
+class ProfilerTest(TempRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(sync.disable_profiling)
+        self.profiler = sync.enable_profiling()
+        for rel in ('.claude/commands/a.md', '.claude/commands/ns/b.md', '.codex/prompts/c.md'):
+            self._write(rel, '# cmd\n')
+        sync.walk_all()
+
+    def test_worker_thread_counters_roll_up_into_explicit_parent(self):
+        scan = next(e for e in self.profiler.events if e['name'] == 'scan')
+        children = [e for e in self.profiler.events if e['name'].startswith('scan:')]
+        self.assertEqual(len(children), len(sync.SCAN_ROOTS))
+        self.assertTrue(all(e['tid'] != scan['tid'] for e in children))
+        for key in ('dir_entries', 'dirs_visited'):
+            self.assertEqual(scan['args'][key], sum(e['args'].get(key, 0) for e in children))
+        self.assertGreaterEqual(scan['args']['dir_entries'], 3)
+
+    def test_write_trace_emits_complete_events(self):
+        path = os.path.join(self.root, 'trace.json')
+        self.profiler.write_trace(Path(path))
+        with open(path, encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual({e['name'] for e in events}, {'scan'} | {'scan:' + name for name, _, _ in sync.SCAN_ROOTS})
+        for event in events:
+            self.assertEqual(event['ph'], 'X')
+            self.assertEqual(event['pid'], os.getpid())
+            self.assertIsInstance(event['tid'], int)
+            self.assertGreaterEqual(event['ts'], 0)
+            self.assertGreaterEqual(event['dur'], 0)
+        # 子阶段落在 scan 的时间区间内
+        scan = next(e for e in events if e['name'] == 'scan')
+        for event in events:
+            self.assertGreaterEqual(event['ts'], scan['ts'])
+            self.assertLessEqual(event['ts'] + event['dur'], scan['ts'] + scan['dur'] + 1)
+
+
+# ============================================
+# TS 分词器与对象提取
+# ============================================
+
+class TsTokenizerTest(unittest.TestCase):
+
+    def test_field_order_does_not_matter(self):
+        a = sync.parse_deprecated_ts("[{ old: '/a', newCmd: '/b', reason: 'r', deprecatedInVersion: 'v1' }]")
+        b = sync.parse_deprecated_ts("[{ deprecatedInVersion: 'v1', reason: 'r', newCmd: '/b', old: '/a' }]")
+        self.assertEqual([d[:4] for d in a], [d[:4] for d in b])
+        self.assertEqual(a[0].new_cmd, '/b')
+        self.assertEqual(a[0].deprecated_in, 'v1')
+
+    def test_quoting_styles(self):
+        fields = _objects('[{ "cmd": "/a", \'desc\': \'it\\\'s\', cli: `claude`, n: 1_000, ok: true, x: null }]')
+        self.assertEqual(fields, [{'cmd': '/a', 'desc': "it's", 'cli': 'claude', 'n': 1000, 'ok': True, 'x': None}])
+
+    def test_escapes(self):
+        fields = _objects(r"[{ a: '中\x41\n', b: '\u{1F600}' }]")
+        self.assertEqual(fields, [{'a': '中A\n', 'b': '\U0001F600'}])
+
+    def test_comments_are_skipped(self):
+        source = """[
+          // { cmd: '/commented' },
+          /* { cmd: '/block' }, */
+          { cmd: '/a', // 行尾注释
+            /* 中间注释 */ desc: 'd' },
+        ]"""
+        self.assertEqual(_objects(source), [{'cmd': '/a', 'desc': 'd'}])
+
+    def test_multiline_and_trailing_comma(self):
+        source = "[\n  {\n    cmd: '/a',\n    status: 'stable',\n  },\n]"
+        self.assertEqual(_objects(source), [{'cmd': '/a', 'status': 'stable'}])
+
+    def test_template_literals(self):
+        source = "[{ a: `plain`, b: `x ${ f({ c: '}' }) } y`, d: 'after' }]"
+        # 含插值的模板整体视为复杂值：跳过该字段，插值中的 `}` 不影响括号配对
+        self.assertEqual(_objects(source), [{'a': 'plain', 'd': 'after'}])
+
+    def test_regex_literals(self):
+        source = "const re = /[{}'\"]+\\//g; const n = a / b / c;\n[{ cmd: '/a' }]"
+        self.assertEqual(_objects(source), [{'cmd': '/a'}])
+
+    def test_nested_objects_and_complex_values(self):
+        source = "[{ cmd: '/a', steps: [{ cmd: '/b' }], meta: { k: 'v' }, fn: () => 1, tail: 'z' }]"
+        self.assertEqual(_objects(source), [{'cmd': '/b'}, {'k': 'v'}, {'cmd': '/a', 'tail': 'z'}])
+
+    def test_ternary_value_does_not_swallow_next_field(self):
+        records = sync.parse_deprecated_ts("[{ old: '/d', newCmd: c ? a : '/e', reason: 'y' }]")
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].old, '/d')
+        self.assertIsNone(records[0].new_cmd)
+        self.assertEqual(records[0].reason, 'y')
+
+    def test_object_positions(self):
+        records = sync.parse_commands_ts("export const C = [\n  { cmd: '/a' },\n    { cmd: '/b' },\n];")
+        self.assertEqual([(c.cmd, c.line, c.col) for c in records], [('/a', 2, 3), ('/b', 3, 5)])
+
+    def test_keyed_extraction_matches_full_tokenization(self):
+        keys = ('cmd', 'desc')
+        sources = [
+            # 跳读快速路径：注释与字符串中的括号、含复杂值的对象、嵌套对象
+            "// { cmd: '/x' }\nconst s = '{[(';\n[{ cmd: '/a', n: 1 },\n { cmd: '/b', tags: ['t'], desc: c ? 'p' : 'q' },\n"
+            " { name: 'n', steps: [{ desc: 'd' }] }, { other: 1 }]",
+            # 正则字面量与除号：回退到完整分词
+            "const re = /[{]/; const n = a / b;\n[{ cmd: '/a', desc: 'd', re: /}/ }]",
+        ]
+        for source in sources:
+            expected = []
+            for obj in sync.iter_ts_objects(source):
+                fields = {key: obj.fields[key] for key in keys if key in obj.fields}
+                if fields:
+                    expected.append((fields, obj.line, obj.col))
+            self.assertEqual([tuple(obj) for obj in sync.iter_ts_objects(source, keys)], expected)
+        self.assertIsNotNone(sync._skim_ts_objects(sources[0], keys))
+        self.assertIsNone(sync._skim_ts_objects(sources[1], keys))
+
+    def assertParseError(self, source: str, line: int, col: int):
+        with self.assertRaises(sync.TsParseError) as ctx:
+            list(sync.iter_ts_objects(source))
+        self.assertEqual((ctx.exception.line, ctx.exception.col), (line, col))
+
+    def test_error_unterminated_string(self):
+        self.assertParseError("[\n  { cmd: '/a }\n]", 2, 10)
+
+    def test_error_unterminated_block_comment(self):
+        self.assertParseError("[\n  /* 注释\n]", 2, 3)
+
+    def test_error_unterminated_template(self):
+        self.assertParseError("[{ a: `x ${ y }", 1, 7)
+
+    def test_error_mismatched_bracket(self):
+        self.assertParseError("[\n  { cmd: '/a' ]", 2, 15)
+
+    def test_error_unclosed_object(self):
+        self.assertParseError("[\n  { cmd: '/a',\n", 2, 3)
+
+    def test_error_message_has_file_position(self):
+        error = sync.TsParseError('未闭合的字符串', 3, 4, 'src/data/commands.ts')
+        self.assertEqual(str(error), 'src/data/commands.ts:3:4: 未闭合的字符串')
+
+
+# ============================================
+# 废弃规则索引
+# ============================================
+
+class DeprecationIndexTest(unittest.TestCase):
+
+    def _index(self, source: str):
+        return sync.DeprecationIndex(sync.parse_deprecated_ts(source))
+
+    def test_chain_resolves_to_terminal(self):
+        index = self._index("[{ old: '/a', newCmd: '/b' }, { old: '/b', newCmd: '/c' }, { old: '/ns:*', newCmd: null }]")
+        d = index.lookup('/a')
+        self.assertEqual((d.chain, d.terminal, d.cycle, d.into_cycle), (('/b', '/c'), '/c', False, False))
+        self.assertEqual(index.lookup('/ns:x:y').rule.old, '/ns:*')
+        self.assertIsNone(index.lookup('/c'))
+
+    def test_only_rules_on_cycle_are_cycles(self):
+        # /y -> /x -> /a -> /b -> /a：只有 /a、/b 在环上
+        for order in ("{ old: '/y', newCmd: '/x' }, { old: '/x', newCmd: '/a' }, "
+                      "{ old: '/a', newCmd: '/b' }, { old: '/b', newCmd: '/a' }",
+                      "{ old: '/b', newCmd: '/a' }, { old: '/a', newCmd: '/b' }, "
+                      "{ old: '/x', newCmd: '/a' }, { old: '/y', newCmd: '/x' }"):
+            index = self._index(f'[{order}]')
+            self.assertEqual(sorted(d.rule.old for d in index.cycles()), ['/a', '/b'])
+            self.assertEqual(sorted(d.rule.old for d in index.into_cycles()), ['/x', '/y'])
+            self.assertIsNone(index.lookup('/y').terminal)
+            self.assertTrue(sync.describe_deprecation(index.lookup('/x')).startswith('[替代链通向环'))
+
+    def test_self_cycle(self):
+        d = self._index("[{ old: '/s', newCmd: '/s' }]").lookup('/s')
+        self.assertEqual((d.cycle, d.into_cycle, d.chain), (True, False, ('/s',)))
+
+
+# ============================================
+# 交叉引用校验
+# ============================================
+
+class CommandMatcherTest(unittest.TestCase):
+
+    def test_overlapping_patterns(self):
+        # 输出沿失败链接合并：she 命中时 he 同时命中
+        matcher = sync.CommandMatcher({'he', 'she', 'his', 'hers'})
+        self.assertEqual(list(matcher.iter_matches('ushers')), [(1, 'she'), (2, 'he'), (2, 'hers')])
+
+    def test_single_first_char_skips_text(self):
+        matcher = sync.CommandMatcher({'/ccw', '/ccw-plan', '/w'})
+        self.assertEqual(sorted(matcher.iter_matches('x /ccw-plan y /w')),
+                         [(2, '/ccw'), (2, '/ccw-plan'), (14, '/w')])
+
+
+class FindCommandRefsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.live = {'/plan', '/ns:a', '/c', '/team-a'}
+        self.declared = {'/plan', '/only-declared'}
+        self.deprecations = sync.DeprecationIndex(sync.parse_deprecated_ts(
+            "[{ old: '/a', newCmd: '/b' }, { old: '/b', newCmd: '/c' }]"))
+        self.known = self.live | self.declared | {'/a', '/b'}
+        self.matcher = sync.CommandMatcher(self.known | sync.command_prefixes(self.known))
+
+    def _refs(self, text: str):
+        return list(sync.find_command_refs(text, self.matcher, self.live, self.declared, self.known,
+                                           self.deprecations))
+
+    def test_deprecated_resolves_to_terminal(self):
+        self.assertEqual(self._refs('用 /a 代替'), [(2, '/a', 'deprecated', '/c')])
+
+    def test_unknown_command_in_namespace_is_dangling(self):
+        self.assertEqual(self._refs('see /ns:x and /ns:a'), [(4, '/ns:x', 'dangling', None)])
+
+    def test_unknown_command_with_hyphen_prefix_is_dangling(self):
+        self.assertEqual(self._refs('/team-b /team-a /team'), [(0, '/team-b', 'dangling', None)])
+
+    def test_declared_without_command_file_is_reported_separately(self):
+        self.assertEqual(self._refs('run /only-declared then /plan'), [(4, '/only-declared', 'declared', None)])
+
+    def test_exact_command_must_match_whole_token(self):
+        # /plan 是 /planner 的前缀，但 /planner 不属于任何已知命名空间
+        self.assertEqual(self._refs('/planner /plan /c.'), [])
+
+    def test_paths_and_urls_are_ignored(self):
+        # 不忽略时 /ns:x 为悬空引用、/a 为废弃引用
+        self.assertEqual(self._refs('src/ns:x http://example.com/a ./a <dir>/team-x.json /ns:y/z'), [])
+
+    def test_one_report_per_offset(self):
+        self.known.add('/ns:sub:a')
+        self.live.add('/ns:sub:a')
+        self.matcher = sync.CommandMatcher(self.known | sync.command_prefixes(self.known))
+        # /ns: 与 /ns:sub: 在同一偏移处都命中
+        self.assertEqual(self._refs('/ns:sub:x'), [(0, '/ns:sub:x', 'dangling', None)])
+
+
+# ============================================
+# 扫描缓存
+# ============================================
+
+class ScanCacheTest(TempRootTestCase):
+
+    # 早于竞态窗口的固定 mtime，目录内容变化后 mtime 必然不同
+    OLD_MTIME_NS = 1_000_000_000 * 10 ** 9
+
+    def setUp(self):
+        super().setUp()
+        self.dir = os.path.join(self.root, 'commands')
+        os.makedirs(self.dir)
+        open(os.path.join(self.dir, 'a.md'), 'w').close()
+        self._age(self.dir)
+        self.scans = 0
+
+    def _age(self, path: str, delta: int = 0):
+        os.utime(path, ns=(self.OLD_MTIME_NS + delta, self.OLD_MTIME_NS + delta))
+
+    def _scan(self):
+        self.scans += 1
+        return sorted(os.listdir(self.dir)), [self.dir]
+
+    def _saved_cache(self) -> 'sync.ScanCache':
+        cache = sync.ScanCache()
+        cache.cached_dir_scan('commands', self._scan)
+        cache.save()
+        return cache
+
+    def _write_manifest(self, **overrides):
+        with open(sync.CACHE_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest.update(overrides)
+        with open(sync.CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+    def test_manifest_is_reused(self):
+        self._saved_cache()
+        cache = sync.ScanCache()
+        self.assertEqual(cache.cached_dir_scan('commands', self._scan), ['a.md'])
+        self.assertEqual(self.scans, 1)
+        self.assertFalse(cache.dirty)
+
+    def test_version_or_root_mismatch_discards_manifest(self):
+        self._saved_cache()
+        for overrides in ({'version': sync.CACHE_VERSION - 1}, {'root': os.path.join(self.root, 'other')}):
+            self._write_manifest(**overrides)
+            cache = sync.ScanCache()
+            self.assertEqual(cache.entries, {})
+            self.assertTrue(cache.dirty)
+            cache.cached_dir_scan('commands', self._scan)
+            cache.save()
+        self.assertEqual(self.scans, 3)
+
+    def test_rebuild_ignores_manifest(self):
+        self._saved_cache()
+        cache = sync.ScanCache(rebuild=True)
+        self.assertEqual(cache.entries, {})
+        cache.cached_dir_scan('commands', self._scan)
+        self.assertEqual(self.scans, 2)
+
+    def test_directory_change_forces_rescan(self):
+        self._saved_cache()
+        open(os.path.join(self.dir, 'b.md'), 'w').close()
+        self._age(self.dir, 1)
+        self.assertEqual(self._saved_cache().cached_dir_scan('commands', self._scan), ['a.md', 'b.md'])
+        os.remove(os.path.join(self.dir, 'a.md'))
+        self._age(self.dir, 2)
+        self.assertEqual(sync.ScanCache().cached_dir_scan('commands', self._scan), ['b.md'])
+        self.assertEqual(self.scans, 3)
+
+    def test_racy_mtime_is_not_trusted(self):
+        # 刚修改过的目录不记录 mtime，下次必定重新扫描
+        os.utime(self.dir)
+        cache = self._saved_cache()
+        self.assertIsNone(cache.entries['commands']['dirs'][self.dir])
+        sync.ScanCache().cached_dir_scan('commands', self._scan)
+        self.assertEqual(self.scans, 2)
+
+    def test_unchanged_file_does_not_dirty_manifest(self):
+        path = sync.Path(self.dir, 'a.md')
+        self._age(path)
+        cache = sync.ScanCache()
+        cache.cached_file_parse('data/a', path, len)
+        cache.cached_content_parse('index/a', b'x', len)
+        cache.save()
+        cache = sync.ScanCache()
+        cache.cached_file_parse('data/a', path, len)
+        cache.cached_content_parse('index/a', b'x', len)
+        self.assertFalse(cache.dirty)
+        # 内容未变但 mtime 变化：复用解析结果，仍需记录新的 mtime
+        self._age(path, 1)
+        cache.cached_file_parse('data/a', path, mock.Mock(side_effect=AssertionError('重新解析')))
+        self.assertTrue(cache.dirty)
+
+
+# ============================================
+# 目录扫描规则
+# ============================================
+
+class ScanRootsTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        for rel in ('commands/agent/a.md', 'commands/workflow/agent/b.md', 'commands/workflow/plan.md',
+                    'skills/_draft/SKILL.md', 'skills/ccw-wiki-sync/SKILL.md', 'skills/good/SKILL.md',
+                    'external/SKILL.md'):
+            path = os.path.join(self.root, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        os.symlink(os.path.join(self.root, 'external'), os.path.join(self.root, 'skills', 'linked'))
+
+    def _walk(self, source: str, subdir: str, flag: str):
+        walker = next(w for name, _, w in sync.SCAN_ROOTS if name == source)
+        entries = walker(os.path.join(self.root, subdir))[0]
+        return sorted(e.rel_path for e in entries if getattr(e, flag))
+
+    def test_sync_rules_skip_agent_private_and_excluded(self):
+        self.assertEqual(self._walk('claude/commands', 'commands', 'synced'), ['workflow/plan.md'])
+        self.assertEqual(self._walk('claude/skills', 'skills', 'synced'), ['good', 'linked'])
+
+    def test_listed_rules_mirror_scan_commands_js(self):
+        self.assertEqual(self._walk('claude/commands', 'commands', 'listed'),
+                         ['agent/a.md', 'workflow/agent/b.md', 'workflow/plan.md'])
+        # Dirent.isDirectory() 不跟随符号链接
+        self.assertEqual(self._walk('claude/skills', 'skills', 'listed'),
+                         ['_draft', 'ccw-wiki-sync', 'good'])
+
+    def test_analysis_reuses_walk(self):
+        self.addCleanup(sync.set_root, sync.ROOT_DIR)
+        os.makedirs(os.path.join(self.root, '.claude'))
+        for name in ('commands', 'skills'):
+            os.rename(os.path.join(self.root, name), os.path.join(self.root, '.claude', name))
+        sync.set_root(sync.Path(self.root))
+        walk = sync.walk_all()
+        with mock.patch.object(sync.os, 'scandir', side_effect=AssertionError('重复遍历')):
+            result = sync.analyze_commands(None, walk)
+            scanned = sync.build_scanned_commands(walk)
+        self.assertEqual(result['all_actual'], {'/workflow:plan', '/good', '/linked'})
+        self.assertEqual(scanned['_metadata']['sources']['claude_commands'], 0)
+
+
+# ============================================
+# 技能重复检测
+# ============================================
+
+class SkillFingerprintTest(TempRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        text = '# 技能\n\n' + '\n'.join(f'步骤 {i}: 执行 /workflow:plan 并检查输出' for i in range(50))
+        for source in ('.claude', '.codex'):
+            self._write(f'{source}/skills/demo/SKILL.md', text)
+        # 非 UTF-8 文件不应导致指纹计算失败
+        with open(os.path.join(self.root, '.claude', 'skills', 'demo', 'legacy.md'), 'wb') as f:
+            f.write(b'# legacy\n\xff\xfe caf\xe9\n')
+        self.scans = {source: sync.scan_root(source) for source in ('claude/skills', 'codex/skills')}
+
+    def _skill(self, source: str, name: str, lines):
+        self._write(f'{source}/skills/{name}/SKILL.md', '\n'.join(lines))
+
+    def _pairs(self, cache=None):
+        scans = {source: sync.scan_root(source) for source in ('claude/skills', 'codex/skills')}
+        pairs = sync.compare_skills(sync.fingerprint_skills(scans, cache))
+        return {(p.claude, p.codex): p.kind for p in pairs if p.claude != '/demo'}
+
+    def test_identical_near_duplicate_and_diverged(self):
+        def lines(name):
+            return [f'{name} 检查项 {i}: 运行 /review 并记录结果' for i in range(50)]
+
+        self._skill('.claude', 'same', lines('same'))
+        self._skill('.codex', 'same', lines('same'))
+        self._skill('.claude', 'near', lines('near'))
+        self._skill('.codex', 'near', lines('near')[:48] + ['改写 1', '改写 2'])
+        self._skill('.claude', 'old', lines('old'))
+        self._skill('.codex', 'old', lines('new'))
+        self.assertEqual(self._pairs(), {
+            ('/same', '/same'): 'identical',
+            ('/near', '/near'): 'near_duplicate',
+            ('/old', '/old'): 'diverged',
+        })
+
+    def test_renamed_near_duplicate_is_found_by_lsh(self):
+        # 名称不同，不经同名兜底，只能由 LSH 分桶成为候选
+        self._skill('.claude', 'alpha', [f'alpha 步骤 {i}' for i in range(50)])
+        self._skill('.codex', 'alpha-v2', [f'alpha 步骤 {i}' for i in range(49)] + ['新增步骤'])
+        self.assertEqual(self._pairs(), {('/alpha', '/alpha-v2'): 'near_duplicate'})
+
+    def test_deleted_files_are_pruned_from_cache(self):
+        cache = sync.ScanCache(persist=False)
+        self._pairs(cache)
+        key = 'fp/.claude/skills/demo/legacy.md'
+        self.assertIn(key, cache.entries)
+        os.remove(os.path.join(self.root, '.claude', 'skills', 'demo', 'legacy.md'))
+        cache.dirty = False
+        self._pairs(cache)
+        self.assertNotIn(key, cache.entries)
+        self.assertIn('fp/.claude/skills/demo/SKILL.md', cache.entries)
+        self.assertTrue(cache.dirty)
+
+    def test_non_utf8_file_is_fingerprinted(self):
+        for cache in (None, sync.ScanCache(persist=False)):
+            pairs = sync.compare_skills(sync.fingerprint_skills(self.scans, cache))
+            self.assertEqual([(p.claude, p.codex) for p in pairs], [('/demo', '/demo')])
+            self.assertNotEqual(pairs[0].kind, 'identical')
+            self.assertGreater(pairs[0].similarity, 0.5)
+
+
+# ============================================
+# 命令索引
+# ============================================
+
+class CommandIndexTest(TempRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._write('.claude/commands/plan.md', '# plan\n')
+        self._write('src/data/commands.ts', "[{ cmd: '/plan', category: 'workflow', cli: 'claude' }]")
+
+    def _query(self, cmd: str):
+        args = argparse.Namespace(no_cache=True, rebuild_cache=False, query=cmd, prefix=None, json=True)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            sync.query_index(args)
+        return json.loads(out.getvalue())['query']
+
+    def test_outdated_index_is_rebuilt(self):
+        # 没有 schema_version、列顺序不同的旧索引
+        sync.INDEX_FILE.parent.mkdir()
+        with closing(sqlite3.connect(sync.INDEX_FILE)) as conn:
+            conn.executescript("""
+                CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE commands (cmd TEXT PRIMARY KEY, path TEXT, source TEXT, in_patterns INTEGER);
+                INSERT INTO commands VALUES ('/plan', 'claude/commands', 'stale', 0);
+            """)
+            conn.commit()
+        found = self._query('/plan')
+        self.assertEqual((found['source'], found['path'], found['category']),
+                         ('claude/commands', '.claude/commands/plan.md', 'workflow'))
+        self.assertEqual(sync.read_index_meta(sync.INDEX_FILE, 'schema_version'), str(sync.INDEX_SCHEMA_VERSION))
+
+    def test_current_index_is_reused(self):
+        self._query('/plan')
+        with mock.patch.object(sync, 'analyze_commands', side_effect=AssertionError('重新分析')):
+            self.assertEqual(self._query('/plan')['cmd'], '/plan')
+
+
+# ============================================
+# 流式 NDJSON 输出
+# ============================================
+
+class NdjsonTest(TempRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._write('.claude/commands/plan.md', '# plan\n')
+        self._write('src/data/commands.ts', "export const COMMANDS = [\n  { cmd: '/plan' },\n];\n")
+
+    def _run(self, **kwargs):
+        args = argparse.Namespace(no_cache=True, rebuild_cache=False, since=None, staged=False)
+        vars(args).update(kwargs)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = sync.run_ndjson(args)
+        return code, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_iter_findings(self):
+        scans = [('claude/commands', [sync.CommandEntry('/plan', 'claude/commands', 'plan.md', 'file'),
+                                      sync.CommandEntry('/old', 'claude/commands', 'old.md', 'file')]),
+                 ('codex/prompts', [sync.CommandEntry('/plan', 'codex/prompts', 'plan.md', 'file')])]
+        ts = sync.parse_commands_ts("[{ cmd: '/plan' }, { cmd: '/gone' }, { cmd: '/gone' }]")
+        deprecated = sync.parse_deprecated_ts("[{ old: '/old', newCmd: '/plan' }]")
+        steps = sync.parse_pattern_steps("[{ cmd: '/orphan' }]")
+        findings = [(f.kind, f.cmd, f.file, f.line) for f in sync.iter_findings(iter(scans), ts, deprecated, steps)]
+        self.assertEqual(findings, [
+            ('missing', '/old', '.claude/commands/old.md', None),
+            ('stale', '/old', '.claude/commands/old.md', None),
+            ('extra', '/gone', 'src/data/commands.ts', 1),
+            ('pattern_orphan', '/orphan', 'src/data/patterns.ts', 1),
+        ])
+        limited = sync.iter_findings(iter(scans), ts, deprecated, steps, affected={'/gone'})
+        self.assertEqual([f.kind for f in limited], ['extra'])
+
+    def test_synced(self):
+        code, lines = self._run()
+        self.assertEqual(code, sync.EXIT_SYNCED)
+        self.assertEqual(lines, [{'kind': 'summary', 'status': 'synced', 'counts': {}}])
+
+    def test_drift(self):
+        self._write('.codex/prompts/new.md', '# new\n')
+        code, lines = self._run()
+        self.assertEqual(code, sync.EXIT_DRIFT)
+        self.assertEqual([(r['kind'], r.get('cmd')) for r in lines], [('missing', '/new'), ('summary', None)])
+        self.assertEqual(lines[-1]['status'], 'drift')
+
+    def test_cycle_alone_is_not_drift(self):
+        # 与文本报告的 SUCCESS、--json 的 synced 一致
+        self._write('src/data/deprecated.ts', "export const D = [\n  { old: '/a', newCmd: '/b' },\n"
+                                              "  { old: '/b', newCmd: '/a' },\n];\n")
+        code, lines = self._run()
+        self.assertEqual(code, sync.EXIT_SYNCED)
+        self.assertEqual(lines[-1], {'kind': 'summary', 'status': 'synced', 'counts': {'deprecation_cycle': 2}})
+        self.assertTrue(sync.summarize_result(sync.analyze_commands(None))['synced'])
+
+    def test_parse_error(self):
+        self._write('src/data/commands.ts', "export const COMMANDS = [\n  { cmd: '/plan },\n];\n")
+        code, lines = self._run()
+        self.assertEqual(code, sync.EXIT_PARSE_ERROR)
+        self.assertEqual((lines[-1]['error'], lines[-1]['file'], lines[-1]['line']),
+                         ('parse', 'src/data/commands.ts', 2))
+
+    def test_git_error(self):
+        with mock.patch.object(sync, 'git_changed_paths', side_effect=sync.GitError('not a git repository')):
+            code, lines = self._run(staged=True)
+        self.assertEqual(code, sync.EXIT_ERROR)
+        self.assertEqual(lines, [{'kind': 'error', 'error': 'git', 'message': 'not a git repository'}])
+
+    def test_usage_error_exit_code_differs_from_ndjson_codes(self):
+        proc = subprocess.run([sys.executable, str(_SCRIPT), '--ndjson', '--bogus'],
+                              cwd=self.root, capture_output=True, text=True)
+        self.assertIn('usage:', proc.stderr)
+        self.assertEqual(proc.stdout, '')
+        codes = {sync.EXIT_SYNCED, sync.EXIT_DRIFT, sync.EXIT_PARSE_ERROR, sync.EXIT_ERROR}
+        self.assertEqual(len(codes), 4)
+        self.assertNotIn(proc.returncode, codes)
+        self.assertEqual(proc.returncode, 2)
+
+
+# ============================================
+# 监视模式
+# ============================================
+
+class WatchTest(TempRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._write('.claude/commands/plan.md', '# plan\n')
+        # 启动时数据文件正在编辑，解析失败
+        self._write('src/data/commands.ts', "export const COMMANDS = [\n  { cmd: '/plan },\n];\n")
+        self.mtime_ns = 1_000_000_000 * 10 ** 9
+
+    def _touch_dir(self, rel: str):
+        # 显式设置 mtime，不依赖文件系统时间戳粒度
+        self.mtime_ns += 10 ** 9
+        os.utime(os.path.join(self.root, rel), ns=(self.mtime_ns, self.mtime_ns))
+
+    def test_diff_results(self):
+        empty = {key: set() for key in sync.DELTA_KEYS}
+        old = dict(empty, missing={'/a', '/b'}, extra={'/x'})
+        new = dict(empty, missing={'/b', '/c'}, extra={'/x'}, pattern_orphans={'/p'})
+        self.assertEqual(sync.diff_results(old, new), {
+            'missing': {'added': ['/c'], 'removed': ['/a']},
+            'pattern_orphans': {'added': ['/p'], 'removed': []},
+        })
+        self.assertEqual(sync.diff_results(new, dict(new)), {})
+
+    def test_poll_debounces_and_recovers_from_startup_parse_error(self):
+        def sleep(seconds):
+            calls.append(seconds)
+            step = len(calls)
+            if step == 1:
+                # 轮询发现变化：修复数据文件
+                self._write('src/data/commands.ts', "export const COMMANDS = [\n  { cmd: '/plan' },\n];\n")
+            elif step == 2:
+                # 防抖等待期间同一批变化仍在继续
+                self._write('.claude/commands/new.md', '# new\n')
+                self._touch_dir('.claude/commands')
+            elif step == 4:
+                os.remove(os.path.join(self.root, '.claude/commands/new.md'))
+                self._touch_dir('.claude/commands')
+            elif step == 6:
+                raise KeyboardInterrupt
+
+        calls = []
+        out, err = io.StringIO(), io.StringIO()
+        analyze = mock.Mock(wraps=sync.analyze_commands)
+        with mock.patch.object(sync.time, 'sleep', side_effect=sleep), \
+                mock.patch.object(sync, 'analyze_commands', analyze), \
+                redirect_stdout(out), mock.patch.object(sync.sys, 'stderr', err):
+            sync.watch_commands(sync.ScanCache(persist=False), interval=1.0, debounce=0.5, as_json=True)
+
+        # 轮询, 防抖（未平息）, 防抖（平息）, 轮询, 防抖（平息）, 轮询
+        self.assertEqual(calls, [1.0, 0.5, 0.5, 1.0, 0.5, 1.0])
+        # 启动一次 + 每批变化一次
+        self.assertEqual(analyze.call_count, 3)
+        self.assertIn('数据文件解析失败', err.getvalue())
+        full, delta = [json.loads(line) for line in out.getvalue().splitlines()]
+        # 启动失败后首次成功的分析输出完整报告，之后只输出增减
+        self.assertEqual(full['missing'], ['/new'])
+        self.assertEqual(delta['delta'], {'missing': {'added': [], 'removed': ['/new']}})
+
+
+# ============================================
+# 多仓库批量分析
+# ============================================
+
+class CompareReposTest(unittest.TestCase):
+
+    @staticmethod
+    def _set(live=(), ts=(), deprecations=()):
+        return {'live': sorted(live), 'ts': sorted(ts),
+                'deprecations': [[old, new, '', '', i + 1, 3] for i, (old, new) in enumerate(deprecations)]}
+
+    def test_only_differing_statuses_are_reported(self):
+        diffs = sync.compare_repos({
+            'a': self._set(live={'/plan', '/skill-a'}, ts={'/ccw', '/plan'},
+                           deprecations=[('/old', '/plan'), ('/gone', '/plan')]),
+            'b': self._set(live={'/plan'}, ts={'/ccw', '/plan', '/skill-a'},
+                           deprecations=[('/old', '/plan'), ('/gone', None)]),
+        })
+        # /ccw 两边都只在 commands.ts 中声明，/old 两边替代命令相同，不算差异
+        self.assertEqual(diffs, {
+            '/skill-a': {'present': ['a'], 'declared': ['b']},
+        })
+
+    def test_deprecated_with_different_replacement_is_reported(self):
+        diffs = sync.compare_repos({
+            'a': self._set(ts={'/old'}, deprecations=[('/old', '/new')]),
+            'b': self._set(ts={'/old'}, deprecations=[('/old', '/newer')]),
+        })
+        self.assertEqual(diffs, {'/old': {'deprecated': {'a': '/new', 'b': '/newer'}}})
+
+    def test_identical_repos_have_no_differences(self):
+        repo = self._set(live={'/plan'}, ts={'/plan', '/ccw'})
+        self.assertEqual(sync.compare_repos({'a': repo, 'b': dict(repo)}), {})
+
+    def test_jobs_must_be_positive(self):
+        for jobs in ('0', '-1'):
+            proc = subprocess.run([sys.executable, str(_SCRIPT), '--batch', '.', '--jobs', jobs],
+                                  capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 2)
+            self.assertIn('--jobs', proc.stderr)
+
+
+# ============================================
+# Git 增量模式
+# ============================================
+
+@unittest.skipUnless(shutil.which('git'), '需要 git')
+class GitIncrementalTest(TempRootTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._git('init', '-q')
+        self._write('.claude/commands/plan.md', '# plan\n')
+        self._write('src/data/commands.ts', "export const COMMANDS = [\n  { cmd: '/plan' },\n];\n")
+        self._commit()
+
+    def _git(self, *args: str):
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@t', *args],
+                       cwd=self.root, check=True, capture_output=True)
+
+    def _commit(self):
+        self._git('add', '-A')
+        self._git('commit', '-q', '-m', 'x')
+
+    def _full_run(self):
+        cache = sync.ScanCache()
+        result = sync.analyze_commands(cache)
+        cache.save()
+        return result
+
+    def test_data_only_change_sees_commands_added_after_full_run(self):
+        self._full_run()
+        # 完整运行之后才提交的新命令文件，不在本次 git 差异中
+        self._write('.codex/prompts/brandnew.md', '# brandnew\n')
+        self._commit()
+        self._write('src/data/commands.ts',
+                    "export const COMMANDS = [\n  { cmd: '/plan' },\n  { cmd: '/brandnew' },\n];\n")
+
+        result = sync.analyze_changed(sync.ScanCache(), since='HEAD')
+        self.assertEqual(result['affected'], {'/brandnew'})
+        self.assertEqual(result['extra'], set())
+        self.assertEqual(result['missing'], set())
+
+    def test_staged_reports_data_change_after_plain_run(self):
+        self._write('src/data/commands.ts',
+                    "export const COMMANDS = [\n  { cmd: '/plan' },\n  { cmd: '/ghost' },\n];\n")
+        self._git('add', 'src/data/commands.ts')
+        self._full_run()
+
+        result = sync.analyze_changed(sync.ScanCache(), staged=True)
+        self.assertEqual(result['extra'], {'/ghost'})
+
+    def test_staged_ignores_unstaged_directories(self):
+        # 未跟踪的技能目录不属于本次提交
+        self._write('.codex/skills/foo/SKILL.md', '# foo\n')
+        self._write('src/data/commands.ts',
+                    "export const COMMANDS = [\n  { cmd: '/plan' },\n  { cmd: '/foo' },\n];\n")
+        self._git('add', 'src/data/commands.ts')
+
+        result = sync.analyze_changed(sync.ScanCache(persist=False), staged=True)
+        self.assertEqual(result['extra'], {'/foo'})
+
+        # 工作区中删除但仍在暂存区的命令文件仍计入
+        os.remove(os.path.join(self.root, '.claude/commands/plan.md'))
+        self._write('.codex/prompts/plan2.md', '# plan2\n')
+        result = sync.analyze_changed(sync.ScanCache(persist=False), staged=True)
+        self.assertIn('/plan', result['all_actual'])
+        self.assertNotIn('/plan2', result['all_actual'])
+
+    def test_root_nested_in_larger_repository(self):
+        # CCW 根目录是外层仓库的子目录（monorepo）
+        outer = tempfile.TemporaryDirectory()
+        self.addCleanup(outer.cleanup)
+        self.root = os.path.join(outer.name, 'ccw')
+        sync.set_root(sync.Path(self.root))
+        self._write('.codex/skills/brainstorm/SKILL.md', '# brainstorm\n')
+        self._write('src/data/commands.ts',
+                    "export const COMMANDS = [\n  { cmd: '/brainstorm' },\n  { cmd: '/plan' },\n];\n")
+        self._write('.claude/commands/plan.md', '# plan\n')
+        subprocess.run(['git', 'init', '-q'], cwd=outer.name, check=True)
+        self._commit()
+
+        self._write('.codex/skills/brainstorm/SKILL.md', '# brainstorm v2\n')
+        self._git('add', '.codex/skills/brainstorm/SKILL.md')
+        result = sync.analyze_changed(sync.ScanCache(persist=False), staged=True)
+        self.assertEqual(result['ts_commands'], {'/brainstorm', '/plan'})
+        self.assertEqual(result['missing'], set())
+
+        self._write('src/data/commands.ts',
+                    "export const COMMANDS = [\n  { cmd: '/brainstorm' },\n  { cmd: '/plan' },\n"
+                    "  { cmd: '/ghost' },\n];\n")
+        result = sync.analyze_changed(sync.ScanCache(persist=False), since='HEAD')
+        self.assertEqual(result['affected'], {'/brainstorm', '/ghost'})
+        self.assertEqual(result['extra'], {'/ghost'})
+
+    def test_unknown_revision_is_an_error(self):
+        self._write('src/data/commands.ts', "export const COMMANDS = [];\n")
+        with self.assertRaises(sync.GitError):
+            sync._load_git_records('commands.ts', sync.parse_commands_ts, sync.Command,
+                                   sync.ScanCache(persist=False), 'no-such-ref', 'git/data/commands.ts')
+
+
+if __name__ == '__main__':
+    unittest.main()